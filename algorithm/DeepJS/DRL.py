@@ -1,17 +1,14 @@
 import tensorflow as tf
 import numpy as np
+from core.alogrithm import Algorithm
+from core.candidates import generate_candidates
+from algorithm.DeepJS.features import extract_features
+from algorithm.DeepJS.trajectory import Node
 
 tf.enable_eager_execution()
 
 
-class Node(object):
-    def __init__(self, observation, action, reward, clock):
-        self.observation = observation
-        self.action = action
-        self.reward = reward
-        self.clock = clock
-
-class RLAlgorithm(object):
+class RLAlgorithm(Algorithm):
     def __init__(self, agent, reward_giver, features_normalize_func, features_extract_func):
         self.agent = agent
         self.reward_giver = reward_giver
@@ -19,22 +16,11 @@ class RLAlgorithm(object):
         self.features_extract_func = features_extract_func
         self.current_trajectory = []
 
-    def extract_features(self, valid_pairs):
-        features = []
-        for machine, task in valid_pairs:
-            features.append([machine.cpu, machine.memory] + self.features_extract_func(task))
-        features = self.features_normalize_func(features)
-        return features
+    def extract_features(self, candidates):
+        return extract_features(candidates, self.features_extract_func, self.features_normalize_func)
 
     def __call__(self, cluster, clock):
-        machines = cluster.machines
-        tasks = cluster.tasks_which_has_waiting_instance
-        all_candidates = []
-
-        for machine in machines:
-            for task in tasks:
-                if machine.accommodate(task):
-                    all_candidates.append((machine, task))
+        all_candidates = generate_candidates(cluster)
         if len(all_candidates) == 0:
             self.current_trajectory.append(Node(None, None, self.reward_giver.get_reward(), clock))
             return None, None
@@ -47,4 +33,4 @@ class RLAlgorithm(object):
             node = Node(features, pair_index, 0, clock)
             self.current_trajectory.append(node)
 
-        return all_candidates[pair_index]
+        return all_candidates.pair(pair_index)
@@ -1,18 +1,68 @@
 import time
-import copy
 import numpy as np
 import tensorflow as tf
 
 
+def discounted_cumsum(x, gamma, block_size=64):
+    """
+    沿最后一维计算折扣累计和 y_t = sum_{k>=t} gamma^(k-t) * x_k
+    每block_size个元素为一块，块内用下三角的折扣矩阵做一次矩阵乘法，块与块之间按gamma^block_size递归地累计，
+    所有折扣系数都不大于1，长序列也不会溢出
+    :param x: (np.ndarray, [..., T])
+    :param gamma:
+    :param block_size:
+    :return: 与x形状相同 (np.ndarray)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    length = x.shape[-1]
+    if length <= block_size:
+        steps = np.arange(length)
+        differences = steps[:, None] - steps[None, :]
+        return x @ np.tril(gamma ** np.maximum(differences, 0))
+
+    blocks_number = -(-length // block_size)
+    padded = np.zeros(x.shape[:-1] + (blocks_number * block_size,))
+    padded[..., :length] = x
+    local = discounted_cumsum(padded.reshape(x.shape[:-1] + (blocks_number, block_size)), gamma, block_size)
+    # 每块第一个元素的完整累计和，再加到前一块上
+    heads = discounted_cumsum(local[..., 0], gamma ** block_size, block_size)
+    following = np.zeros_like(heads)
+    following[..., :-1] = heads[..., 1:]
+    y = local + following[..., None] * gamma ** (block_size - np.arange(block_size))
+    return y.reshape(padded.shape)[..., :length]
+
+
+def pad(sequences):
+    """
+    把长度不同的序列在末尾补0，排成二维数组
+    :param sequences:
+    :return: (padded, mask)，mask标记每个位置是否在序列长度之内
+    """
+    lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+    mask = np.arange(lengths.max() if len(lengths) > 0 else 0) < lengths[:, None]
+    padded = np.zeros(mask.shape)
+    if mask.size > 0:
+        padded[mask] = np.concatenate([np.asarray(sequence, dtype=np.float64) for sequence in sequences])
+    return padded, mask
+
+
+def unpad(padded, mask):
+    return [row[:length] for row, length in zip(padded, mask.sum(axis=1))]
+
+
 class Agent(object):
+    # 每隔多少个决策步骤更新一次参数
+    update_batch_size = 1000
+
     def __init__(self, name, brain, gamma, reward_to_go, nn_baseline, normalize_advantages, model_save_path=None,
-                 summary_path=None):
+                 summary_path=None, batched_update=True):
         super().__init__()
 
         self.gamma = gamma
         self.reward_to_go = reward_to_go
         self.baseline = nn_baseline
         self.normalize_advantages = normalize_advantages
+        self.batched_update = batched_update
         self.optimizer = tf.train.AdamOptimizer(learning_rate=0.001)
 
 
@@ -91,23 +141,20 @@ class Agent(object):
 
             Store the Q-values for all timesteps and all trajectories in a variable 'q_n'.
         """
-        q_s = []
-        for re in rewards_n:
-            q = []
-            cur_q = 0
-            for reward in reversed(re):
-                cur_q = cur_q * self.gamma + reward
-                q.append(cur_q)
-            q = list(reversed(q))
-            q_s.append(q)
-
-        if self.reward_to_go:
-            return q_s
-        else:
-            q_n = []
-            for q in q_s:
-                q_n.append([q[0]] * len(q))
-            return q_n
+        rewards, mask = pad(rewards_n)
+        return unpad(self._padded_sum_of_rewards(rewards, mask), mask)
+
+    def _padded_sum_of_rewards(self, rewards, mask):
+        """
+        _sum_of_rewards的补齐数组版本
+        :param rewards: 末尾补0的奖励 (np.ndarray, [轨迹数, 最大长度])
+        :param mask:
+        :return: 补齐的Q值，补齐的位置为0
+        """
+        q = discounted_cumsum(rewards, self.gamma)
+        if not self.reward_to_go and q.shape[1] > 0:
+            q = np.where(mask, q[:, :1], 0)
+        return q
 
     def _compute_advantage(self, q_n):
         """
@@ -119,24 +166,19 @@ class Agent(object):
             returns:
                 adv_n: shape: (...).
         """
-        # Computing Baselines
+        q, mask = pad(q_n)
+        return unpad(self._padded_advantage(q, mask), mask)
+
+    def _padded_advantage(self, q, mask):
+        """
+        _compute_advantage的补齐数组版本，基线为每个时刻所有轨迹Q值的平均（补齐的位置按0计入）
+        :param q: 补齐的Q值
+        :param mask:
+        :return: 补齐的优势
+        """
         if self.baseline:
-            adv_n = copy.deepcopy(q_n)
-            max_length = max([len(adv) for adv in adv_n])
-            for adv in adv_n:
-                while len(adv) < max_length:
-                    adv.append(0)
-            adv_n = np.array(adv_n)
-            adv_n = adv_n - adv_n.mean(axis=0)
-
-            adv_n__ = []
-            for i in range(adv_n.shape[0]):
-                original_length = len(q_n[i])
-                adv_n__.append(list(adv_n[i][:original_length]))
-            return adv_n__
-        else:
-            adv_n = q_n.copy()
-            return adv_n
+            return np.where(mask, q - q.mean(axis=0), 0)
+        return q
 
     def estimate_return(self, rewards_n):
         """
@@ -150,34 +192,45 @@ class Agent(object):
                 q_n: shape: (...).
                 adv_n: shape: (...).
         """
-        q_n = self._sum_of_rewards(rewards_n)
-        adv_n = self._compute_advantage(q_n)
+        rewards, mask = pad(rewards_n)
+        q = self._padded_sum_of_rewards(rewards, mask)
+        adv = self._padded_advantage(q, mask)
 
         # Advantage Normalization
         if self.normalize_advantages:
-            # On the next line, implement a trick which is known empirically to reduce variance
-            # in policy gradient methods: normalize adv_n to have mean zero and std=1.
-            adv_s = []
-            for advantages in adv_n:
-                for advantage in advantages:
-                    adv_s.append(advantage)
-            adv_s = np.array(adv_s)
-            mean = adv_s.mean()
-            std = adv_s.std()
-            adv_n__ = []
-            for advantages in adv_n:
-                advantages__ = []
-                for advantage in advantages:
-                    advantages__.append((advantage - mean) / (std + np.finfo(np.float32).eps))
-                adv_n__.append(advantages__)
-            adv_n = adv_n__
-        return q_n, adv_n
+            # normalize adv_n to have mean zero and std=1 over all valid time steps.
+            mean = adv[mask].mean()
+            std = adv[mask].std()
+            adv = (adv - mean) / (std + np.finfo(np.float32).eps)
+        return unpad(q, mask), unpad(adv, mask)
 
     def _loss(self, X, y, adv):
         logits = self.brain(X)
         logprob = - tf.losses.sparse_softmax_cross_entropy(labels=y, logits=logits)
         return logprob * adv
 
+    def _batch_loss(self, observations, actions, advantages):
+        """
+        一批决策步骤的损失：所有步骤的候选特征按行拼接后只做一次前向计算，再按步骤分段(segment)计算log-softmax
+        每个步骤的损失与_loss相同
+        :param observations: 每个步骤的特征矩阵，行数各不相同
+        :param actions: 每个步骤选择的行
+        :param advantages:
+        :return: 每个步骤的损失 (tensor)
+        """
+        rows_numbers = np.array([int(observation.shape[0]) for observation in observations])
+        segment_ids = np.repeat(np.arange(len(observations), dtype=np.int32), rows_numbers)
+        offsets = np.cumsum(rows_numbers) - rows_numbers
+
+        X = tf.concat([tf.convert_to_tensor(observation, dtype=tf.float32) for observation in observations], axis=0)
+        logits = tf.reshape(self.brain(X), [-1])
+        # 减去每段的最大值再求logsumexp，避免exp溢出
+        segment_max = tf.stop_gradient(tf.segment_max(logits, segment_ids))
+        shifted = logits - tf.gather(segment_max, segment_ids)
+        log_sum_exp = tf.log(tf.segment_sum(tf.exp(shifted), segment_ids))
+        logprob = tf.gather(shifted, offsets + np.array(actions)) - log_sum_exp
+        return - logprob * tf.constant(advantages, dtype=tf.float32)
+
     def update_parameters(self, all_observations, all_actions, all_advantages):
         """
             Update the parameters of the policy.
@@ -190,6 +243,36 @@ class Agent(object):
             returns:
                 nothing
         """
+        if self.batched_update:
+            self._update_parameters_batched(all_observations, all_actions, all_advantages)
+        else:
+            self._update_parameters_per_step(all_observations, all_actions, all_advantages)
+
+    def _update_parameters_batched(self, all_observations, all_actions, all_advantages):
+        """
+        每条轨迹的决策步骤按update_batch_size分批，每批只计算一次梯度，
+        批内损失取平均，与逐步骤计算梯度再取平均的结果相同
+        """
+        loss_values = []
+        advantages__ = []
+        for observations, actions, advantages in zip(all_observations, all_actions, all_advantages):
+            steps = [(observation, action, advantage)
+                     for observation, action, advantage in zip(observations, actions, advantages)
+                     if observation is not None and action is not None]
+            for start in range(0, len(steps), self.update_batch_size):
+                batch_observations, batch_actions, batch_advantages = zip(*steps[start:start + self.update_batch_size])
+                with tf.GradientTape() as t:
+                    losses = self._batch_loss(batch_observations, batch_actions, batch_advantages)
+                    loss_value = tf.reduce_mean(losses)
+                grads = t.gradient(loss_value, self.brain.variables)
+                self.optimizer.apply_gradients(zip(grads, self.brain.variables), self.global_step)
+                loss_values.extend(losses.numpy().tolist())
+                advantages__.extend(batch_advantages)
+
+        self.log('loss', np.mean(loss_values), self.global_step)
+        self.log('adv', np.mean(advantages__), self.global_step)
+
+    def _update_parameters_per_step(self, all_observations, all_actions, all_advantages):
         loss_values = []
         advantages__ = []
         for observations, actions, advantages in zip(all_observations, all_actions, all_advantages):
@@ -207,8 +290,7 @@ class Agent(object):
                 loss_values.append(loss_value)
                 advantages__.append(advantage)
 
-                if cnt % 1000 == 0:
-                    # assert len(grads_by_trajectory) == 1000
+                if cnt % self.update_batch_size == 0:
                     self.optimize(grads_by_trajectory)
                     grads_by_trajectory = []
                 cnt += 1
@@ -1,3 +1,4 @@
+import numpy as np
 import tensorflow as tf
 
 
@@ -59,3 +60,34 @@ class BrainSmall(tf.keras.Model):
         state = self.dense_3(state)
         state = self.dense_4(state)
         return tf.expand_dims(tf.squeeze(state, axis=-1), axis=0)
+
+
+def export_weights(brain, filename):
+    """
+    把Brain的参数导出成npz文件，供NumpyBrain.load()读取
+    :param brain: Brain、BrainBig或BrainSmall，必须已经调用过一次以创建参数
+    :param filename:
+    :return:
+    """
+    weights = brain.get_weights()
+    arrays = {'name': brain.name, 'layers_number': len(weights) // 2}
+    for i in range(len(weights) // 2):
+        arrays['kernel_%d' % i] = weights[2 * i]
+        arrays['bias_%d' % i] = weights[2 * i + 1]
+    np.savez(filename, **arrays)
+
+
+def export_checkpoint(brain, state_size, checkpoint_path, filename):
+    """
+    从Agent.save()保存的检查点恢复参数后导出
+    :param brain: 与训练时结构相同的新Brain，例如Brain(state_size)
+    :param state_size: 特征数
+    :param checkpoint_path: 检查点，例如tf.train.latest_checkpoint(model_dir)
+    :param filename:
+    :return:
+    """
+    status = tf.train.Checkpoint(brain=brain).restore(checkpoint_path)
+    # 调用一次以创建参数，检查点中的值在参数创建时写入
+    brain(tf.zeros((1, state_size)))
+    status.assert_consumed()
+    export_weights(brain, filename)
@@ -0,0 +1,22 @@
+import numpy as np
+
+"""
+
+定义了extract_features函数
+
+RLAlgorithm（训练）和NumpyRLAlgorithm（部署）共用的候选对特征提取，只依赖numpy
+
+"""
+
+
+def extract_features(candidates, features_extract_func, features_normalize_func):
+    """
+    候选对的特征：机器的cpu和memory空闲量加上任务特征，任务特征每个任务只提取一次，再按候选对的下标切片
+    :param candidates: Candidates
+    :param features_extract_func:
+    :param features_normalize_func:
+    :return: (np.ndarray, [候选对数, 特征数])
+    """
+    task_features = np.array([features_extract_func(task) for task in candidates.tasks], dtype=float)
+    features = np.hstack([candidates.pair_machine_features[:, :2], task_features[candidates.task_indices]])
+    return features_normalize_func(features)
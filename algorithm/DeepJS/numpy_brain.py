@@ -0,0 +1,101 @@
+import numpy as np
+from core.alogrithm import Algorithm
+from core.candidates import generate_candidates
+from algorithm.DeepJS.features import extract_features
+from algorithm.DeepJS.trajectory import Node
+
+"""
+
+定义了NumpyBrain和NumpyRLAlgorithm类
+
+Brain、BrainBig和BrainSmall都是很小的tanh多层感知机，部署时不需要tensorflow：
+先用algorithm.DeepJS.brain模块中的export_weights(brain, filename)或
+export_checkpoint(brain, state_size, checkpoint_path, filename)把训练好的参数导出成npz文件，
+再用NumpyBrain.load()读取，NumpyRLAlgorithm用numpy完成前向计算和采样，每次决策只需要几十微秒
+
+NumpyRLAlgorithm与RLAlgorithm提取相同的特征(features.extract_features)，选择每个候选对的概率同为softmax(logits)
+
+"""
+
+
+class NumpyBrain(object):
+    """
+
+    name - 导出参数的Brain的名字 (str)
+    kernels/biases - 每个全连接层的权重矩阵和偏置 (list)
+
+    除最后一层外每层都使用tanh激活，与Brain、BrainBig和BrainSmall的结构一致
+
+    """
+
+    def __init__(self, kernels, biases, name=None):
+        self.kernels = [np.asarray(kernel, dtype=np.float32) for kernel in kernels]
+        self.biases = [np.asarray(bias, dtype=np.float32) for bias in biases]
+        self.name = name
+
+    @staticmethod
+    def load(filename):
+        """
+        读取algorithm.DeepJS.brain.export_weights(brain, filename)导出的参数
+        :param filename:
+        :return: NumpyBrain
+        """
+        with np.load(filename) as weights:
+            layers_number = int(weights['layers_number'])
+            return NumpyBrain([weights['kernel_%d' % i] for i in range(layers_number)],
+                              [weights['bias_%d' % i] for i in range(layers_number)], str(weights['name']))
+
+    def __call__(self, state):
+        """
+        前向计算
+        :param state: 候选对的特征 (np.ndarray, [候选对数, 特征数])
+        :return: logits，形状与Brain的输出相同 (np.ndarray, [1, 候选对数])
+        """
+        state = np.asarray(state, dtype=np.float32)
+        for kernel, bias in zip(self.kernels[:-1], self.biases[:-1]):
+            state = np.tanh(state @ kernel + bias)
+        state = state @ self.kernels[-1] + self.biases[-1]
+        return state[:, 0][np.newaxis, :]
+
+
+class NumpyRLAlgorithm(Algorithm):
+    """
+
+    brain - NumpyBrain
+    features_normalize_func/features_extract_func - 与训练时RLAlgorithm使用的相同
+    reward_giver - 为None时不记录轨迹；不为None时与RLAlgorithm一样记录current_trajectory
+
+    """
+
+    def __init__(self, brain, features_normalize_func, features_extract_func, reward_giver=None):
+        self.brain = brain
+        self.features_normalize_func = features_normalize_func
+        self.features_extract_func = features_extract_func
+        self.reward_giver = reward_giver
+        self.current_trajectory = []
+
+    @staticmethod
+    def sample(logits):
+        """
+        按softmax(logits)的概率抽取一个下标，随机数来自np.random
+        :param logits: (np.ndarray, [候选对数])
+        :return: (int)
+        """
+        probabilities = np.exp(logits - logits.max())
+        cumulative = np.cumsum(probabilities, dtype=np.float64)
+        return min(int(np.searchsorted(cumulative, np.random.rand() * cumulative[-1], side='right')),
+                   len(logits) - 1)
+
+    def __call__(self, cluster, clock):
+        all_candidates = generate_candidates(cluster)
+        if len(all_candidates) == 0:
+            if self.reward_giver is not None:
+                self.current_trajectory.append(Node(None, None, self.reward_giver.get_reward(), clock))
+            return None, None
+
+        features = extract_features(all_candidates, self.features_extract_func, self.features_normalize_func)
+        features = features.astype(np.float32)
+        pair_index = NumpyRLAlgorithm.sample(self.brain(features)[0])
+        if self.reward_giver is not None:
+            self.current_trajectory.append(Node(features, pair_index, 0, clock))
+        return all_candidates.pair(pair_index)
@@ -44,5 +44,4 @@ class AverageCompletionRewardGiver(RewardGiver):
     def get_reward(self):
         super().get_reward()
         cluster = self.simulation.cluster
-        unfinished_task_len = len(cluster.unfinished_tasks)
-        return - unfinished_task_len
+        return - cluster.unfinished_tasks_number
@@ -0,0 +1,204 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+from algorithm.DeepJS.DRL import RLAlgorithm
+from utils.parallel_runner import EpisodeSpec, ParallelRunner
+
+"""
+
+定义了SharedWeights、RolloutAlgorithmFactory和RolloutWorkerPool类
+
+DeepJS训练时每次更新参数需要运行多个试验，RolloutWorkerPool把这些试验分发到多个工作进程中并行运行：
+1. 学习者(learner)在每一轮开始时把Brain的最新参数写入共享内存(SharedWeights.publish)
+2. 每个工作进程在创建RLAlgorithm时检查共享内存中的参数版本，版本变化时才重新读取参数(brain.set_weights)
+3. 工作进程运行Episode，把current_trajectory压缩成Trajectory（特征、动作、奖励、时刻）传回学习者
+4. 学习者用Agent.estimate_return和Agent.update_parameters更新参数
+
+参数只在两轮之间写入，工作进程读取时学习者不会同时写入，因此不需要加锁
+工作进程默认通过spawn启动，避免在fork出的子进程中继续使用父进程的tensorflow运行时
+
+"""
+
+
+class SharedWeights(object):
+    """
+
+    shapes - 每个参数数组的形状 (list)
+    shared - 共享内存，前8个字节是参数版本，之后依次存放float32的参数
+    owner - 是否由本进程创建共享内存 (bool)
+
+    """
+
+    def __init__(self, shapes, shared, owner):
+        self.shapes = shapes
+        self.shared = shared
+        self.owner = owner
+        self.version = np.ndarray(1, np.int64, buffer=shared.buf)
+        sizes = [int(np.prod(shape)) for shape in shapes]
+        offsets = np.cumsum([0] + sizes)
+        values = np.ndarray(offsets[-1], np.float32, buffer=shared.buf, offset=8)
+        self.arrays = [values[offsets[i]:offsets[i + 1]].reshape(shape) for i, shape in enumerate(shapes)]
+
+    @staticmethod
+    def create(weights):
+        """
+        按一组参数的形状创建共享内存，并写入这组参数
+        :param weights: brain.get_weights()
+        :return: SharedWeights
+        """
+        shapes = [np.shape(weight) for weight in weights]
+        size = 8 + 4 * sum(int(np.prod(shape)) for shape in shapes)
+        shared_weights = SharedWeights(shapes, shared_memory.SharedMemory(create=True, size=size), True)
+        shared_weights.publish(weights)
+        return shared_weights
+
+    @property
+    def handle(self):
+        return self.shared.name, self.shapes
+
+    @staticmethod
+    def attach(handle):
+        name, shapes = handle
+        return SharedWeights(shapes, shared_memory.SharedMemory(name=name), False)
+
+    def publish(self, weights):
+        """
+        写入新的参数并增加版本
+        :param weights:
+        :return:
+        """
+        for array, weight in zip(self.arrays, weights):
+            array[:] = weight
+        self.version[0] += 1
+
+    def pull(self):
+        """
+        读取参数的副本
+        :return: (版本, 参数列表)
+        """
+        return int(self.version[0]), [array.copy() for array in self.arrays]
+
+    def close(self):
+        self.version = None
+        self.arrays = []
+        self.shared.close()
+        if self.owner:
+            self.shared.unlink()
+
+
+class _WorkerAgent(object):
+    """
+    工作进程中RLAlgorithm使用的Agent，只需要brain，不创建优化器和日志
+    """
+
+    def __init__(self, brain):
+        self.brain = brain
+
+
+# 工作进程中的SharedWeights、Brain和已加载的参数版本
+_worker_state = {}
+
+
+class RolloutAlgorithmFactory(object):
+    """
+
+    brain_factory - 创建Brain的可调用对象，例如functools.partial(Brain, state_size)
+    reward_giver_factory - 创建RewardGiver的可调用对象，例如MakespanRewardGiver类或functools.partial
+    features_normalize_func/features_extract_func - 同RLAlgorithm
+    weights_handle - SharedWeights.handle
+
+    以上对象都必须可以被pickle；每个工作进程只创建一个Brain，之后的试验复用它，只在参数版本变化时更新参数
+
+    """
+
+    def __init__(self, brain_factory, reward_giver_factory, features_normalize_func, features_extract_func,
+                 weights_handle):
+        self.brain_factory = brain_factory
+        self.reward_giver_factory = reward_giver_factory
+        self.features_normalize_func = features_normalize_func
+        self.features_extract_func = features_extract_func
+        self.weights_handle = weights_handle
+
+    def brain(self):
+        if _worker_state.get('handle') != self.weights_handle:
+            _worker_state['handle'] = self.weights_handle
+            _worker_state['weights'] = SharedWeights.attach(self.weights_handle)
+            brain = self.brain_factory()
+            # 调用一次以创建参数，输入维度即第一层权重矩阵的行数
+            brain(np.zeros((1, self.weights_handle[1][0][0]), dtype=np.float32))
+            _worker_state['brain'] = brain
+            _worker_state['version'] = None
+
+        version = int(_worker_state['weights'].version[0])
+        if _worker_state['version'] != version:
+            _worker_state['version'], weights = _worker_state['weights'].pull()
+            _worker_state['brain'].set_weights(weights)
+        return _worker_state['brain']
+
+    def __call__(self):
+        return RLAlgorithm(_WorkerAgent(self.brain()), self.reward_giver_factory(), self.features_normalize_func,
+                           self.features_extract_func)
+
+
+class RolloutWorkerPool(object):
+    """
+
+    agent - 学习者的Agent
+    brain_factory/reward_giver_factory/features_normalize_func/features_extract_func - 同RolloutAlgorithmFactory
+    arena - 所有试验共享的JobArena，为None时作业配置单独序列化 (JobArena)
+    max_workers - 工作进程数，默认为CPU核数 (int)
+    mp_context - multiprocessing上下文，默认为spawn
+    episode_kwargs - 传给Episode的其他参数 (dict)
+
+    可以作为上下文管理器使用，退出时关闭进程池并释放共享内存
+
+    """
+
+    def __init__(self, agent, brain_factory, reward_giver_factory, features_normalize_func, features_extract_func,
+                 arena=None, max_workers=None, mp_context=None, episode_kwargs=None):
+        self.agent = agent
+        self.shared_weights = SharedWeights.create(agent.brain.get_weights())
+        self.algorithm_factory = RolloutAlgorithmFactory(brain_factory, reward_giver_factory, features_normalize_func,
+                                                         features_extract_func, self.shared_weights.handle)
+        self.episode_kwargs = episode_kwargs
+        if mp_context is None:
+            mp_context = multiprocessing.get_context('spawn')
+        self.runner = ParallelRunner(arena, max_workers, collect_trajectories=True, mp_context=mp_context)
+
+    def collect(self, machine_configs, job_configs, episodes_number, seed=0):
+        """
+        使用学习者当前的参数并行运行episodes_number个试验
+        :param machine_configs:
+        :param job_configs: 作业配置，JobArenaView或作业配置列表
+        :param episodes_number:
+        :param seed: 第i个试验的随机数种子为seed + i
+        :return: EpisodeResult列表，轨迹为EpisodeResult.trajectory
+        """
+        self.shared_weights.publish(self.agent.brain.get_weights())
+        specs = [EpisodeSpec(self.algorithm_factory, machine_configs, job_configs, seed + i,
+                             episode_kwargs=self.episode_kwargs) for i in range(episodes_number)]
+        return self.runner.run(specs)
+
+    def update_parameters(self, trajectories):
+        """
+        用一组轨迹更新学习者的参数
+        :param trajectories: Trajectory列表
+        :return: (q_s, advantages)
+        """
+        all_observations = [trajectory.observations for trajectory in trajectories]
+        all_actions = [trajectory.action_list for trajectory in trajectories]
+        all_rewards = [trajectory.rewards.tolist() for trajectory in trajectories]
+        all_q_s, all_advantages = self.agent.estimate_return(all_rewards)
+        self.agent.update_parameters(all_observations, all_actions, all_advantages)
+        return all_q_s, all_advantages
+
+    def close(self):
+        self.runner.close()
+        self.shared_weights.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,81 @@
+import numpy as np
+
+"""
+
+定义了Node和Trajectory类
+
+Node是RLAlgorithm和NumpyRLAlgorithm在每个决策时刻记录的轨迹节点，Trajectory是RLAlgorithm.current_trajectory的紧凑形式：每个决策节点的特征矩阵行数不同，全部按行拼接成一个二维数组，
+再用offsets记录每个节点的起始行，动作、奖励和时刻各是一个一维数组
+只依赖numpy，可以在进程之间低开销地传递，不需要导入tensorflow
+
+"""
+
+
+class Node(object):
+    def __init__(self, observation, action, reward, clock):
+        self.observation = observation
+        self.action = action
+        self.reward = reward
+        self.clock = clock
+
+
+class Trajectory(object):
+    """
+
+    features - 所有节点的特征按行拼接 (np.ndarray, float32, [行数, 特征数])
+    offsets - 每个节点的特征在features中的起始行，最后一个元素为总行数 (np.ndarray)
+    actions - 每个节点选择的候选对下标，没有可选候选对的节点为-1 (np.ndarray)
+    rewards - 每个节点的奖励 (np.ndarray)
+    clocks - 每个节点的决策时刻 (np.ndarray)
+
+    """
+
+    def __init__(self, features, offsets, actions, rewards, clocks):
+        self.features = features
+        self.offsets = offsets
+        self.actions = actions
+        self.rewards = rewards
+        self.clocks = clocks
+
+    @staticmethod
+    def from_nodes(nodes):
+        """
+        由RLAlgorithm记录的Node列表创建
+        :param nodes:
+        :return: Trajectory
+        """
+        observations = [np.zeros((0, 0), dtype=np.float32) if node.observation is None else
+                        np.asarray(node.observation, dtype=np.float32) for node in nodes]
+        rows_numbers = np.array([len(observation) for observation in observations], dtype=np.int64)
+        non_empty = [observation for observation in observations if len(observation) > 0]
+        features = np.concatenate(non_empty) if len(non_empty) > 0 else np.zeros((0, 0), dtype=np.float32)
+        offsets = np.concatenate([[0], np.cumsum(rows_numbers)])
+        actions = np.array([-1 if node.action is None else node.action for node in nodes], dtype=np.int64)
+        rewards = np.array([node.reward for node in nodes], dtype=np.float64)
+        clocks = np.array([node.clock for node in nodes], dtype=np.float64)
+        return Trajectory(features, offsets, actions, rewards, clocks)
+
+    def __len__(self):
+        return len(self.actions)
+
+    def observation(self, i):
+        """
+        第i个节点的特征矩阵，没有可选候选对的节点为None
+        :param i:
+        :return:
+        """
+        if self.actions[i] < 0:
+            return None
+        return self.features[self.offsets[i]:self.offsets[i + 1]]
+
+    @property
+    def observations(self):
+        return [self.observation(i) for i in range(len(self))]
+
+    @property
+    def action_list(self):
+        """
+        Agent.update_parameters使用的动作列表，没有可选候选对的节点为None
+        :return:
+        """
+        return [None if action < 0 else action for action in self.actions.tolist()]
@@ -1,17 +1,7 @@
-from core.alogrithm import Algorithm
+from algorithm.heuristic.first_fit import FirstFitAlgorithm
 
 
-class DRF(Algorithm):
-    def __call__(self, cluster, clock):
-        machines = cluster.machines
-        unfinished_tasks = cluster.unfinished_tasks
-        candidate_task = None
-        candidate_machine = None
-
-        for machine in machines:
-            for task in unfinished_tasks:
-                if machine.accommodate(task):
-                    candidate_machine = machine
-                    candidate_task = task
-                    break
-        return candidate_machine, candidate_task
+class DRF(FirstFitAlgorithm):
+    """
+    与FirstFitAlgorithm的选择顺序相同：能容纳某个等待任务的最后一台机器，以及该机器能容纳的第一个任务
+    """
@@ -1,17 +1,56 @@
+import numpy as np
 from core.alogrithm import Algorithm
+from core.candidates import generate_candidates
 
 
 class FirstFitAlgorithm(Algorithm):
     def __call__(self, cluster, clock):
-        machines = cluster.machines
+        """
+        选出能容纳某个等待任务的最后一台机器，以及该机器能容纳的第一个任务
+        与逐对调用machine.accommodate(task)的结果相同，但每个任务只需在空闲容量索引中查询一次
+        """
+        capacity_index = cluster.capacity_index
         tasks = cluster.tasks_which_has_waiting_instance
         candidate_task = None
-        candidate_machine = None
+        candidate_position = None
+        last_position = len(cluster.machines) - 1
 
-        for machine in machines:
-            for task in tasks:
-                if machine.accommodate(task):
-                    candidate_machine = machine
-                    candidate_task = task
+        for task in tasks:
+            position = capacity_index.first_fit_position(
+                task.task_config.cpu, task.task_config.memory, task.task_config.disk, reverse=True)
+            if position is not None and (candidate_position is None or position > candidate_position):
+                candidate_position = position
+                candidate_task = task
+                if position == last_position:
                     break
-        return candidate_machine, candidate_task
+        if candidate_task is None:
+            return None, None
+        return cluster.machines[candidate_position], candidate_task
+
+    def make_decisions(self, cluster, clock):
+        """
+        一次性完成本时刻的装箱，结果与反复调用__call__()并逐个执行相同：
+        从最后一台机器开始，依次把它能容纳的第一个仍有等待实例的任务放上去，直到它装不下任何任务，再处理前一台机器
+        时刻内机器的剩余资源只减不增，一开始就装不下的(机器, 任务)对之后也装不下，因此只需检查初始的候选对
+        """
+        candidates = generate_candidates(cluster)
+        machines = candidates.machines
+        tasks = candidates.tasks
+        task_indices = candidates.task_indices
+        offsets = np.searchsorted(candidates.machine_indices, np.arange(len(machines) + 1))
+        waiting = [task.waiting_task_instances_number for task in tasks]
+
+        placements = []
+        for machine_index in range(len(machines) - 1, -1, -1):
+            machine = machines[machine_index]
+            cpu, memory, disk = machine.cpu, machine.memory, machine.disk
+            for task_index in task_indices[offsets[machine_index]:offsets[machine_index + 1]]:
+                task_config = tasks[task_index].task_config
+                while waiting[task_index] > 0 and cpu >= task_config.cpu and memory >= task_config.memory \
+                        and disk >= task_config.disk:
+                    placements.append((machine, tasks[task_index]))
+                    cpu -= task_config.cpu
+                    memory -= task_config.memory
+                    disk -= task_config.disk
+                    waiting[task_index] -= 1
+        return placements
@@ -1,5 +1,6 @@
 import numpy as np
 from core.alogrithm import Algorithm
+from core.candidates import generate_candidates
 
 
 class RandomAlgorithm(Algorithm):
@@ -7,24 +8,20 @@ class RandomAlgorithm(Algorithm):
         self.threshold = threshold
 
     def __call__(self, cluster, clock):
-        machines = cluster.machines
-        tasks = cluster.tasks_which_has_waiting_instance
-        candidate_task = None
-        candidate_machine = None
-        all_candidates = []
-
-        for machine in machines:
-            for task in tasks:
-                if machine.accommodate(task):
-                    all_candidates.append((machine, task))
-                    if np.random.rand() > self.threshold:
-                        candidate_machine = machine
-                        candidate_task = task
-                        break
-        if len(all_candidates) == 0:
+        candidates = generate_candidates(cluster)
+        if len(candidates) == 0:
             return None, None
-        if candidate_task is None:
-            pair_index = np.random.randint(0, len(all_candidates))
-            return all_candidates[pair_index]
-        else:
-            return candidate_machine, candidate_task
+
+        # 按机器顺序依次为候选对抽签，某台机器抽中后跳过它剩余的候选对，最终返回最后一次抽中的候选对
+        machine_indices = candidates.machine_indices
+        pair_index = None
+        i = 0
+        while i < len(candidates):
+            if np.random.rand() > self.threshold:
+                pair_index = i
+                i = np.searchsorted(machine_indices, machine_indices[i], side='right')
+            else:
+                i += 1
+        if pair_index is None:
+            pair_index = np.random.randint(0, len(candidates))
+        return candidates.pair(pair_index)
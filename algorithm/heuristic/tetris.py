@@ -1,29 +1,52 @@
 import numpy as np
 from core.alogrithm import Algorithm
+from core.candidates import generate_candidates
 
 
 class Tetris(Algorithm):
     @staticmethod
-    def calculate_alignment(valid_pairs):
-        machine_features = []
-        task_features = []
-        for index, pair in enumerate(valid_pairs):
-            machine = pair[0]
-            task = pair[1]
-            machine_features.append(machine.feature[:2])
-            task_features.append([task.task_config.cpu, task.task_config.memory])
-        return np.argmax(np.sum(np.array(machine_features) * np.array(task_features), axis=1), axis=0)
+    def calculate_alignment(candidates):
+        machine_features = candidates.pair_machine_features[:, :2]
+        task_features = candidates.pair_task_features[:, :2]
+        return np.argmax(np.sum(machine_features * task_features, axis=1), axis=0)
 
     def __call__(self, cluster, clock):
-        machines = cluster.machines
-        tasks = cluster.tasks_which_has_waiting_instance
-        valid_pairs = []
-        for machine in machines:
-            for task in tasks:
-                if machine.accommodate(task):
-                    valid_pairs.append((machine, task))
-        if len(valid_pairs) == 0:
+        candidates = generate_candidates(cluster)
+        if len(candidates) == 0:
             return None, None
-        pair_index = Tetris.calculate_alignment(valid_pairs)
-        pair = valid_pairs[pair_index]
-        return pair[0], pair[1]
\ No newline at end of file
+        pair_index = Tetris.calculate_alignment(candidates)
+        return candidates.pair(pair_index)
+
+    def make_decisions(self, cluster, clock):
+        """
+        一次性完成本时刻的装箱，结果与反复调用__call__()并逐个执行相同
+        对齐分数保存在(机器, 任务)矩阵中，每次放置后只重新计算被放置机器的那一行，
+        并屏蔽等待实例已经分配完的任务列
+        """
+        candidates = generate_candidates(cluster)
+        if len(candidates) == 0:
+            return []
+        free = candidates.machine_features
+        demand = candidates.task_features
+        tasks_number = len(candidates.tasks)
+        waiting = np.array([task.waiting_task_instances_number for task in candidates.tasks])
+
+        fits = np.zeros((len(candidates.machines), tasks_number), dtype=bool)
+        fits[candidates.machine_indices, candidates.task_indices] = True
+        alignments = free[:, None, 0] * demand[None, :, 0] + free[:, None, 1] * demand[None, :, 1]
+
+        placements = []
+        while True:
+            machine_index, task_index = divmod(int(np.argmax(np.where(fits, alignments, -np.inf))), tasks_number)
+            if not fits[machine_index, task_index]:
+                break
+            placements.append((candidates.machines[machine_index], candidates.tasks[task_index]))
+            free[machine_index] -= demand[task_index]
+            waiting[task_index] -= 1
+            if waiting[task_index] == 0:
+                fits[:, task_index] = False
+            fits[machine_index] &= (free[machine_index, 0] >= demand[:, 0]) & \
+                                   (free[machine_index, 1] >= demand[:, 1]) & \
+                                   (free[machine_index, 2] >= demand[:, 2])
+            alignments[machine_index] = free[machine_index, 0] * demand[:, 0] + free[machine_index, 1] * demand[:, 1]
+        return placements
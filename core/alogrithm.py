@@ -6,8 +6,23 @@ from abc import ABC, abstractmethod # abc模块 用于定义抽象父类(ABC)
 抽象类Algorithm 是所有算法的父类
 所有算法都必须继承它，并且重写__call__()方法
 
+__call__()每次返回一个(machine, task)对，没有可行的放置时返回(None, None)
+make_decisions()是可选的批量接口，返回本时刻的一组放置决策，由调度器依次检查可行性后执行
+默认实现是一个适配器：逐个产出__call__()的决策，调度器执行完上一个决策后才会再次调用__call__()，
+因此只实现了__call__()的算法行为不变。__call__()返回不可行的决策时适配器立即结束本时刻的决策，
+否则集群状态不变，__call__()会反复返回同一个决策。能够一次性完成整个时刻装箱的算法可以重写make_decisions()
+
 """
 class Algorithm(ABC):
     @abstractmethod # 用于标记抽象方法
     def __call__(self, cluster, clock):
         pass
+
+    def make_decisions(self, cluster, clock):
+        while True:
+            machine, task = self(cluster, clock)
+            if machine is None or task is None:
+                return
+            if not (task.has_waiting_task_instances and machine.accommodate(task)):
+                return
+            yield machine, task
@@ -11,7 +11,10 @@ class Broker(object):
     env - 当前的仿真环境，simpy的环境对象
     simulation - 当前的仿真对象
     cluster - Broker会向集群中添加作业
-    job_configs - 作业配置，决定了在仿真过程中创建哪些作业
+    job_configs - 作业配置，决定了在仿真过程中创建哪些作业，可以是列表，也可以是按提交时间顺序产生JobConfig的
+                  任意迭代器/生成器（例如CSVReader.stream()），Broker每提交一个作业才取出下一个作业配置，
+                  因此内存中只保留当前等待提交的作业配置
+    next_submit_time - 下一个将要提交的作业的提交时间，没有则为None
     
     """
 
@@ -21,6 +24,7 @@ class Broker(object):
         self.cluster = None
         self.destroyed = False
         self.job_configs = job_configs
+        self.next_submit_time = None
 
     def attach(self, simulation):
         """
@@ -37,9 +41,12 @@ class Broker(object):
         :return:
         """
         for job_config in self.job_configs:
+            # 作业配置必须按提交时间排序
             assert job_config.submit_time >= self.env.now
+            self.next_submit_time = job_config.submit_time
             yield self.env.timeout(job_config.submit_time - self.env.now)
-            job = Broker.job_cls(self.env, job_config)
+            job = self.job_cls(self.env, job_config)
             # print(f"作业{int(job.id)} 于 {int(self.env.now)}到达集群")
             self.cluster.add_job(job)
+        self.next_submit_time = None
         self.destroyed = True
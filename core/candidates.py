@@ -0,0 +1,90 @@
+import numpy as np
+
+"""
+
+定义了候选(机器, 任务)对的生成器
+
+机器剩余资源矩阵由集群的空闲容量索引维护，任务需求矩阵每次调用时按任务列表构建一次，
+可行性由一次广播比较得到，算法直接使用返回的下标数组，不再对每个(机器, 任务)对调用Machine.accommodate
+
+"""
+
+
+class Candidates(object):
+    """
+
+    machines - 集群中的机器列表 (list)
+    tasks - 参与生成候选对的任务列表 (list)
+    machine_features - 每台机器当前剩余的(cpu, memory, disk)，形状为(M, 3) (np.ndarray)
+    task_features - 每个任务实例的(cpu, memory, disk)需求，形状为(T, 3) (np.ndarray)
+    machine_indices - 每个候选对的机器下标，按机器优先、任务其次的顺序排列 (np.ndarray)
+    task_indices - 每个候选对的任务下标 (np.ndarray)
+
+    候选对的顺序与按机器、任务两层循环调用machine.accommodate(task)得到的顺序相同
+
+    """
+
+    def __init__(self, machines, tasks, machine_features, task_features, machine_indices, task_indices):
+        self.machines = machines
+        self.tasks = tasks
+        self.machine_features = machine_features
+        self.task_features = task_features
+        self.machine_indices = machine_indices
+        self.task_indices = task_indices
+
+    def __len__(self):
+        return len(self.machine_indices)
+
+    def pair(self, pair_index):
+        """
+        返回第pair_index个候选对 (machine, task)
+        :param pair_index:
+        :return:
+        """
+        return self.machines[self.machine_indices[pair_index]], self.tasks[self.task_indices[pair_index]]
+
+    @property
+    def pair_machine_features(self):
+        """
+        每个候选对中机器的剩余资源，形状为(P, 3)
+        :return:
+        """
+        return self.machine_features[self.machine_indices]
+
+    @property
+    def pair_task_features(self):
+        """
+        每个候选对中任务的资源需求，形状为(P, 3)
+        :return:
+        """
+        return self.task_features[self.task_indices]
+
+
+def task_demands(tasks):
+    """
+    构建任务需求矩阵，每行是一个任务实例的(cpu, memory, disk)
+    :param tasks:
+    :return:
+    """
+    return np.array([[task.task_config.cpu, task.task_config.memory, task.task_config.disk] for task in tasks],
+                    dtype=float).reshape(-1, 3)
+
+
+def generate_candidates(cluster, tasks=None):
+    """
+    生成所有可行的(机器, 任务)对
+    :param cluster:
+    :param tasks: 参与匹配的任务，默认为集群中所有包含等待任务实例的任务
+    :return: Candidates
+    """
+    if tasks is None:
+        tasks = cluster.tasks_which_has_waiting_instance
+    machine_features = cluster.capacity_index.free_resources.copy()
+    task_features = task_demands(tasks)
+
+    # 逐资源广播比较，避免生成(M, T, 3)的中间数组
+    mask = machine_features[:, None, 0] >= task_features[None, :, 0]
+    mask &= machine_features[:, None, 1] >= task_features[None, :, 1]
+    mask &= machine_features[:, None, 2] >= task_features[None, :, 2]
+    machine_indices, task_indices = np.nonzero(mask)
+    return Candidates(cluster.machines, tasks, machine_features, task_features, machine_indices, task_indices)
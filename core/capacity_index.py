@@ -0,0 +1,196 @@
+from bisect import bisect_left, insort
+import numpy as np
+
+"""
+
+定义了一个CapacityIndex类
+
+集群拥有的多资源空闲容量索引，用于回答“哪些机器能容纳(cpu, memory, disk)这一资源需求”，
+以及首适应(first-fit)、最佳适应(best-fit)、最差适应(worst-fit)查询，避免算法对每个(机器, 任务)对调用Machine.accommodate
+
+"""
+
+
+class CapacityIndex(object):
+    """
+
+    machines - 索引中的机器列表，顺序与Cluster.machines一致 (list)
+    _positions - 机器id到其在machines中位置的映射 (dict)
+    _cpu/_memory/_disk - 线段树，叶子是每台机器当前剩余的资源量，内部节点是子树中的最大值 (list)
+    _sorted_by_cpu - 按(剩余cpu, 位置)排序的列表，用于best-fit/worst-fit (list)
+    free_resources - 每台机器当前剩余的(cpu, memory, disk)矩阵，形状为(M, 3) (np.ndarray)
+
+    首适应查询沿线段树下降，剪掉任意一种资源的最大值都不满足需求的子树，通常为O(log M)
+    best-fit/worst-fit以剩余cpu为主资源，二分定位后只检查cpu满足需求的机器的内存和磁盘
+    机器在Machine.run_task_instance()/stop_task_instance()中调用update()同步剩余资源
+
+    """
+
+    def __init__(self):
+        self.machines = []
+        self._positions = {}
+        self._size = 1
+        self._cpu = [float('-inf')] * 2
+        self._memory = [float('-inf')] * 2
+        self._disk = [float('-inf')] * 2
+        self._cpu_values = []
+        self._sorted_by_cpu = []
+        self._free_resources = np.zeros((1, 3))
+
+    def add_machine(self, machine):
+        """
+        将机器加入索引，位置为当前机器数量
+        机器按id定位，id重复（例如重复使用同一个MachineConfig）时抛出ValueError
+        :param machine:
+        :return:
+        """
+        if machine.id in self._positions:
+            raise ValueError('Duplicate machine id: %s.' % machine.id)
+        position = len(self.machines)
+        self.machines.append(machine)
+        self._positions[machine.id] = position
+        if position >= self._size:
+            self._grow()
+        if position >= len(self._free_resources):
+            self._free_resources = np.concatenate([self._free_resources, np.zeros_like(self._free_resources)])
+        self._cpu_values.append(machine.cpu)
+        insort(self._sorted_by_cpu, (machine.cpu, position))
+        self._set_leaf(position, machine)
+
+    def update(self, machine):
+        """
+        机器的剩余资源发生变化后调用，同步线段树和排序列表
+        :param machine:
+        :return:
+        """
+        position = self._positions[machine.id]
+        old_cpu = self._cpu_values[position]
+        if old_cpu != machine.cpu:
+            del self._sorted_by_cpu[bisect_left(self._sorted_by_cpu, (old_cpu, position))]
+            insort(self._sorted_by_cpu, (machine.cpu, position))
+            self._cpu_values[position] = machine.cpu
+        self._set_leaf(position, machine)
+
+    @property
+    def free_resources(self):
+        """
+        返回机器剩余资源矩阵的视图，每行是一台机器的(cpu, memory, disk)，随update()原地更新
+        :return:
+        """
+        return self._free_resources[:len(self.machines)]
+
+    def position(self, machine):
+        """
+        返回机器在索引（即Cluster.machines）中的位置
+        :param machine:
+        :return:
+        """
+        return self._positions[machine.id]
+
+    def machines_which_can_accommodate(self, cpu, memory, disk):
+        """
+        返回所有能容纳该资源需求的机器，按机器顺序排列
+        :return: (list)
+        """
+        return [self.machines[position] for position in self._fit_positions(cpu, memory, disk)]
+
+    def first_fit(self, cpu, memory, disk, reverse=False):
+        """
+        返回第一台（reverse为True时为最后一台）能容纳该资源需求的机器，没有则返回None
+        :return:
+        """
+        position = self.first_fit_position(cpu, memory, disk, reverse)
+        return None if position is None else self.machines[position]
+
+    def first_fit_position(self, cpu, memory, disk, reverse=False):
+        """
+        与first_fit相同，但返回机器的位置
+        :return:
+        """
+        stack = [1]
+        while stack:
+            node = stack.pop()
+            if not self._node_fits(node, cpu, memory, disk):
+                continue
+            if node >= self._size:
+                return node - self._size
+            # 先处理的子节点后入栈
+            if reverse:
+                stack.append(2 * node)
+                stack.append(2 * node + 1)
+            else:
+                stack.append(2 * node + 1)
+                stack.append(2 * node)
+        return None
+
+    def best_fit(self, cpu, memory, disk):
+        """
+        返回剩余cpu最少且能容纳该资源需求的机器，剩余cpu相同时取位置靠前的机器，没有则返回None
+        :return:
+        """
+        start = bisect_left(self._sorted_by_cpu, (cpu, -1))
+        for i in range(start, len(self._sorted_by_cpu)):
+            machine = self.machines[self._sorted_by_cpu[i][1]]
+            if machine.memory >= memory and machine.disk >= disk:
+                return machine
+        return None
+
+    def worst_fit(self, cpu, memory, disk):
+        """
+        返回剩余cpu最多且能容纳该资源需求的机器，剩余cpu相同时取位置靠前的机器，没有则返回None
+        :return:
+        """
+        candidate = None
+        for i in range(len(self._sorted_by_cpu) - 1, -1, -1):
+            machine_cpu, position = self._sorted_by_cpu[i]
+            if machine_cpu < cpu:
+                break
+            if candidate is not None and machine_cpu < candidate.cpu:
+                break
+            machine = self.machines[position]
+            if machine.memory >= memory and machine.disk >= disk:
+                candidate = machine
+        return candidate
+
+    def _fit_positions(self, cpu, memory, disk):
+        positions = []
+        stack = [1]
+        while stack:
+            node = stack.pop()
+            if not self._node_fits(node, cpu, memory, disk):
+                continue
+            if node >= self._size:
+                positions.append(node - self._size)
+            else:
+                stack.append(2 * node + 1)
+                stack.append(2 * node)
+        return positions
+
+    def _node_fits(self, node, cpu, memory, disk):
+        return self._cpu[node] >= cpu and self._memory[node] >= memory and self._disk[node] >= disk
+
+    def _set_leaf(self, position, machine):
+        self._free_resources[position] = (machine.cpu, machine.memory, machine.disk)
+        node = position + self._size
+        self._cpu[node] = machine.cpu
+        self._memory[node] = machine.memory
+        self._disk[node] = machine.disk
+        node //= 2
+        while node >= 1:
+            left, right = 2 * node, 2 * node + 1
+            self._cpu[node] = max(self._cpu[left], self._cpu[right])
+            self._memory[node] = max(self._memory[left], self._memory[right])
+            self._disk[node] = max(self._disk[left], self._disk[right])
+            node //= 2
+
+    def _grow(self):
+        """
+        线段树容量翻倍，并根据已有的机器重建
+        :return:
+        """
+        self._size *= 2
+        self._cpu = [float('-inf')] * (2 * self._size)
+        self._memory = [float('-inf')] * (2 * self._size)
+        self._disk = [float('-inf')] * (2 * self._size)
+        for position, machine in enumerate(self.machines[:-1]):
+            self._set_leaf(position, machine)
@@ -1,4 +1,7 @@
-from core.machine import Machine
+from enum import Enum
+
+from core.capacity_index import CapacityIndex
+from core.machine import Machine, RetirementPolicy
 
 """
 
@@ -10,18 +13,33 @@ from core.machine import Machine
 """
 
 
+class ClusterEvent(Enum):
+    JOB_ARRIVED = 0  # 作业到达集群
+    TASK_INSTANCE_STARTED = 1  # 任务实例开始执行
+    TASK_INSTANCE_FINISHED = 2  # 任务实例执行完成
+
+
 class Cluster(object):
     """
 
     machines - 一个列表，用于存储集群中的所有机器。每个机器都包含自身的资源和任务实例
+    capacity_index - 集群的多资源空闲容量索引，用于快速查询能容纳某个资源需求的机器 (CapacityIndex)
+    listeners - 集群状态变化的监听者，每次作业到达、任务实例启动/完成后以ClusterEvent为参数调用 (list)
+    retirement_policy - 机器如何处理已完成的任务实例 (RetirementPolicy)
+    task_instance_history - RetirementPolicy.HISTORY策略下已完成任务实例写入的历史存储 (TaskInstanceHistory)
     jobs - 一个列表，用于存储集群中的所有作业(job对象)。每个作业可能包含多个任务，作业会在集群中运行
+           退役策略不是KEEP时，作业完成后即从jobs中释放，只保留released_*计数器
+    released_jobs_number - 已完成并被释放的作业数量 (int)
+    released_tasks_number - 被释放的作业中的任务数量 (int)
+    released_tasks_completion_time - 被释放的任务的完成时间（完成时刻-开始时刻）之和 (float)
+    released_tasks_slowdown - 被释放的任务的慢速度（完成时间/任务持续时间）之和 (float)
 
     unfinished_jobs - 集群中所有尚未完成的作业列表
     ready_unfinished_tasks - 集群中所有尚未完成且已准备好的任务列表
     tasks_which_has_waiting_instance - 所有包含等待任务实例的任务列表
     ready_tasks_which_has_waiting_instance - 所有已经准备好且包含等待任务实例的任务列表
-    finished_jobs - 集群中所有已经完成的作业列表
-    finished_tasks - 集群中所有已经完成的任务列表
+    finished_jobs - 集群中所有已经完成的作业列表，退役策略不是KEEP时为空
+    finished_tasks - 集群中所有已经完成的任务列表，退役策略不是KEEP时为空
     running_task_instances - 集群中所有正在运行的任务实例列表
     cpu - 集群中所有机器的当前 CPU 剩余量的总和
     memory - 集群中所有机器的当前内存剩余量的总和
@@ -31,11 +49,41 @@ class Cluster(object):
     disk_capacity - 集群中所有机器的磁盘总容量
     state - 集群的所有状态信息
 
+    作业、任务和任务实例的集合不再在每次查询时重新遍历全部作业，
+    而是由TaskInstance -> Task -> Job -> Cluster 的状态转移通知（on_*方法）增量维护，
+    对应的数量（*_number）可以O(1)获取
+
+    退役策略不是KEEP时，已完成的作业连同其任务和任务实例一起从集群中释放，
+    长时间仿真的内存占用只取决于尚未完成的作业，metricCalculations中的指标改用released_*计数器
+
     """
 
-    def __init__(self):
+    def __init__(self, retirement_policy=RetirementPolicy.KEEP, task_instance_history=None):
+        if retirement_policy is RetirementPolicy.HISTORY and task_instance_history is None:
+            raise ValueError('RetirementPolicy.HISTORY requires a task_instance_history.')
+        self.retirement_policy = retirement_policy
+        self.task_instance_history = task_instance_history
         self.machines = []
         self.jobs = []
+        self.capacity_index = CapacityIndex()
+        self.listeners = []
+
+        # 增量维护的集合，字典作为有序集合使用，保持作业到达/任务配置的先后顺序
+        self._unfinished_jobs = {}
+        self._finished_jobs = []
+        self._finished_jobs_number = 0
+        self._unfinished_tasks = {}
+        self._finished_tasks = []
+        self._finished_tasks_number = 0
+        self._tasks_which_has_waiting_instance = {}
+        self._ready_tasks_which_has_waiting_instance = {}
+        self._running_task_instances_number = 0
+
+        # 已释放的作业的计数器
+        self.released_jobs_number = 0
+        self.released_tasks_number = 0
+        self.released_tasks_completion_time = 0
+        self.released_tasks_slowdown = 0
 
     @property
     def unfinished_jobs(self):
@@ -43,11 +91,7 @@ class Cluster(object):
         集群中所有尚未完成的作业job列表
         :return: 集群中所有尚未完成的作业列表（list）
         """
-        ls = []
-        for job in self.jobs:
-            if not job.finished:
-                ls.append(job)
-        return ls
+        return list(self._unfinished_jobs)
 
     @property
     def unfinished_tasks(self):
@@ -55,10 +99,7 @@ class Cluster(object):
         集群中所有尚未完成的任务task列表
         :return:
         """
-        ls = []
-        for job in self.jobs:
-            ls.extend(job.unfinished_tasks)
-        return ls
+        return list(self._unfinished_tasks)
 
     @property
     def ready_unfinished_tasks(self):
@@ -67,8 +108,9 @@ class Cluster(object):
         :return:
         """
         ls = []
-        for job in self.jobs:
-            ls.extend(job.ready_unfinished_tasks)
+        for task in self._unfinished_tasks:
+            if task.ready:
+                ls.append(task)
         return ls
 
     @property
@@ -77,64 +119,153 @@ class Cluster(object):
         集群中所有包含等待任务实例的任务列表
         :return:
         """
-        ls = []
-        for job in self.jobs:
-            ls.extend(job.tasks_which_has_waiting_instance)
-        return ls
+        return list(self._tasks_which_has_waiting_instance)
 
     @property
     def ready_tasks_which_has_waiting_instance(self):
         """
-        返回所有已经准备好且包含等待任务实例的任务列表
+        返回所有已经准备好且包含等待任务实例的任务列表，即各作业就绪前沿的并集
         :return:
         """
-        ls = []
-        for job in self.jobs:
-            ls.extend(job.ready_tasks_which_has_waiting_instance)
-        return ls
+        return list(self._ready_tasks_which_has_waiting_instance)
 
     @property
     def finished_jobs(self):
         """
-        返回集群中所有已经完成的作业列表
+        返回集群中所有已经完成的作业列表，按完成的先后顺序排列
         :return:
         """
-        ls = []
-        for job in self.jobs:
-            if job.finished:
-                ls.append(job)
-        return ls
+        return list(self._finished_jobs)
 
     @property
     def finished_tasks(self):
         """
-        返回集群中所有已经完成的任务列表
+        返回集群中所有已经完成的任务列表，按完成的先后顺序排列
         :return:
         """
-        ls = []
-        for job in self.jobs:
-            ls.extend(job.finished_tasks)
-        return ls
+        return list(self._finished_tasks)
 
     @property
     def running_task_instances(self):
         """
-        返回集群中所有正在运行的任务实例列表
+        返回集群中所有正在运行的任务实例列表，正在运行的实例只属于未完成的任务
         :return:
         """
         task_instances = []
-        for machine in self.machines:
-            task_instances.extend(machine.running_task_instances)
+        for task in self._unfinished_tasks:
+            task_instances.extend(task.running_task_instances)
         return task_instances
 
+    @property
+    def unfinished_jobs_number(self):
+        return len(self._unfinished_jobs)
+
+    @property
+    def finished_jobs_number(self):
+        return self._finished_jobs_number
+
+    @property
+    def unfinished_tasks_number(self):
+        return len(self._unfinished_tasks)
+
+    @property
+    def finished_tasks_number(self):
+        return self._finished_tasks_number
+
+    @property
+    def arrived_jobs_number(self):
+        return len(self.jobs) + self.released_jobs_number
+
+    @property
+    def running_task_instances_number(self):
+        return self._running_task_instances_number
+
     def add_machines(self, machine_configs):
         for machine_config in machine_configs:
             machine = Machine(machine_config)
             self.machines.append(machine)
             machine.attach(self)
+            self.capacity_index.add_machine(machine)
 
     def add_job(self, job):
+        """
+        由Broker.run()在作业到达时调用，登记作业当前的任务状态，之后的变化由作业通知
+        :param job:
+        :return:
+        """
         self.jobs.append(job)
+        job.attach(self)
+        for task in job.unfinished_tasks:
+            self._unfinished_tasks[task] = None
+        for task in job.tasks_which_has_waiting_instance:
+            self._tasks_which_has_waiting_instance[task] = None
+        for task in job.ready_tasks_which_has_waiting_instance:
+            self._ready_tasks_which_has_waiting_instance[task] = None
+        for task in job.finished_tasks:
+            self._retain_finished_task(task)
+        if job.finished:
+            self._retain_finished_job(job)
+        else:
+            self._unfinished_jobs[job] = None
+        self.notify(ClusterEvent.JOB_ARRIVED)
+
+    def add_listener(self, listener):
+        """
+        注册集群状态变化的监听者
+        :param listener: 以ClusterEvent为参数的可调用对象
+        :return:
+        """
+        self.listeners.append(listener)
+
+    def notify(self, event):
+        for listener in self.listeners:
+            listener(event)
+
+    def on_task_instance_started(self, task):
+        self._running_task_instances_number += 1
+        self.notify(ClusterEvent.TASK_INSTANCE_STARTED)
+
+    def on_task_instance_finished(self, task):
+        self._running_task_instances_number -= 1
+        self.notify(ClusterEvent.TASK_INSTANCE_FINISHED)
+
+    def on_task_waiting_instances_exhausted(self, task):
+        del self._tasks_which_has_waiting_instance[task]
+        self._ready_tasks_which_has_waiting_instance.pop(task, None)
+
+    def on_task_ready(self, task):
+        self._ready_tasks_which_has_waiting_instance[task] = None
+
+    def on_task_finished(self, task):
+        del self._unfinished_tasks[task]
+        self._retain_finished_task(task)
+
+    def on_job_finished(self, job):
+        del self._unfinished_jobs[job]
+        self._retain_finished_job(job)
+
+    def _retain_finished_task(self, task):
+        self._finished_tasks_number += 1
+        if self.retirement_policy is RetirementPolicy.KEEP:
+            self._finished_tasks.append(task)
+
+    def _retain_finished_job(self, job):
+        """
+        KEEP策略下保留已完成的作业；其他策略下把作业从jobs中移除，只把指标需要的量累加到released_*计数器中
+        :param job:
+        :return:
+        """
+        self._finished_jobs_number += 1
+        if self.retirement_policy is RetirementPolicy.KEEP:
+            self._finished_jobs.append(job)
+            return
+        self.jobs.remove(job)
+        self.released_jobs_number += 1
+        for task in job.tasks:
+            self.released_tasks_number += 1
+            self.released_tasks_completion_time += task.finished_timestamp - task.started_timestamp
+            self.released_tasks_slowdown += \
+                (task.finished_timestamp - task.started_timestamp) / task.task_config.duration
 
     @property
     def cpu(self):
@@ -200,12 +331,12 @@ class Cluster(object):
         :return:
         """
         return {
-            'arrived_jobs': len(self.jobs),
-            'unfinished_jobs': len(self.unfinished_jobs),
-            'finished_jobs': len(self.finished_jobs),
-            'unfinished_tasks': len(self.unfinished_tasks),
-            'finished_tasks': len(self.finished_tasks),
-            'running_task_instances': len(self.running_task_instances),
+            'arrived_jobs': self.arrived_jobs_number,
+            'unfinished_jobs': self.unfinished_jobs_number,
+            'finished_jobs': self.finished_jobs_number,
+            'unfinished_tasks': self.unfinished_tasks_number,
+            'finished_tasks': self.finished_tasks_number,
+            'running_task_instances': self.running_task_instances_number,
             'machine_states': [machine.state for machine in self.machines],
             'cpu': self.cpu / self.cpu_capacity,
             'memory': self.memory / self.memory_capacity,
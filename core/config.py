@@ -17,9 +17,14 @@ class TaskConfig(object):
 
     次顶层的配置类，描述了一个任务的配置信息，涵盖了任务的索引、实例数量、资源需求
 
+    level - 任务在作业DAG中的拓扑层次，没有父任务的任务为0 (int)
+    upward_rank - 从该任务开始到作业结束的最长路径长度（包含任务自身的持续时间） (float)
+    这两个值由轨迹读取时预先计算，没有预先计算时upward_rank为None
+
     """
 
-    def __init__(self, task_index, instances_number, cpu, memory, disk, duration, parent_indices=None):
+    def __init__(self, task_index, instances_number, cpu, memory, disk, duration, parent_indices=None,
+                 level=0, upward_rank=None):
         self.task_index = task_index
         self.instances_number = instances_number
         self.cpu = cpu
@@ -27,17 +32,22 @@ class TaskConfig(object):
         self.disk = disk
         self.duration = duration
         self.parent_indices = parent_indices
+        self.level = level
+        self.upward_rank = upward_rank
 
 
 class JobConfig(object):
     """
     最顶层的配置类，定义了一个作业整体的配置信息
+
+    critical_path_length - 作业DAG的关键路径长度，即任务upward_rank的最大值，没有预先计算时为None (float)
     """
 
-    def __init__(self, idx, submit_time, task_configs):
+    def __init__(self, idx, submit_time, task_configs, critical_path_length=None):
         self.submit_time = submit_time
         self.task_configs = task_configs
         self.id = idx
+        self.critical_path_length = critical_path_length
 
 
 class MachineConfig(object):
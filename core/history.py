@@ -0,0 +1,49 @@
+import csv
+
+"""
+
+定义了一个TaskInstanceHistory类
+
+只追加的任务实例历史存储。机器按照退役策略(RetirementPolicy.HISTORY)把已完成的任务实例写入这里后就不再保存它们，
+长时间的仿真中机器的内存占用因此保持不变，需要时再从文件中读回历史记录
+
+"""
+
+
+class TaskInstanceHistory(object):
+    """
+
+    filename - 历史记录文件（csv格式，每行一个已完成的任务实例）
+    fields - 每条记录的字段
+
+    """
+    fields = ['task_instance_id', 'machine_id', 'started_timestamp', 'finished_timestamp', 'cpu', 'memory', 'disk']
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(TaskInstanceHistory.fields)
+
+    def append(self, task_instance_id, machine_id, started_timestamp, finished_timestamp, cpu, memory, disk):
+        self.writer.writerow([task_instance_id, machine_id, started_timestamp, finished_timestamp, cpu, memory, disk])
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    @staticmethod
+    def read(filename):
+        """
+        逐条读回历史记录
+        :param filename:
+        :return: 以fields为键的字典的生成器
+        """
+        with open(filename, newline='') as f:
+            for row in csv.DictReader(f):
+                row['machine_id'] = int(row['machine_id'])
+                for key in ('started_timestamp', 'finished_timestamp', 'cpu', 'memory', 'disk'):
+                    row[key] = float(row[key])
+                yield row
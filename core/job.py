@@ -1,3 +1,5 @@
+import numpy as np
+
 from core.config import *
 
 
@@ -8,7 +10,7 @@ class Task(object):
     job - 任务所属的作业 (job)
     task_index - 任务在作业中的索引 (int)
     task_config - 任务的配置对象，包括了Task的具体参数 (TaskConfig)
-    _ready - 标记任务是否准备好执行 （bool）
+    _ready - 标记任务是否准备好执行，由所属Job的依赖引擎在最后一个父任务完成时置为True （bool）
     task_instances - 存储任务实例的列表 (list)
     next_instance_pointer - 指向下一个待调度任务实例的指针 (int)
 
@@ -20,11 +22,17 @@ class Task(object):
     waiting_task_instances_number - 任务实例中尚未调度的数量 (int)
     has_waiting_task_instances - 是否还有未调度的任务实例 (bool)
     finished - 判断任务是否完成 (bool)
-    started_timestamp - 任务开始执行的时间戳 (float)
-    finished_timestamp - 任务完成的时间戳 (float)
+    started_timestamp - 任务开始执行的时间戳，即第一个任务实例启动的时间，尚未开始为None (float)
+    finished_timestamp - 任务完成的时间戳，即最后一个任务实例完成的时间，任务完成时固定下来，尚未完成为None (float)
+    running_task_instances_number - 正在运行的任务实例数量，随实例启动/完成增量维护 (int)
+    finished_task_instances_number - 已完成的任务实例数量，随实例完成增量维护 (int)
 
     函数：
     start_task_instance(machine) - 将下一个任务实例分配到指定的机器上执行
+    task_instance(task_instance_index) - 返回指定下标的任务实例
+    on_task_instance_started(task_instance_index) - 任务实例启动时的状态转移通知
+    on_task_instance_finished(task_instance_index) - 任务实例完成时的状态转移通知
+    状态转移通知只传递实例的下标，紧凑任务(CompactTask)因此不必为通知创建TaskInstance对象，需要实例时调用task_instance()
 
     """
     def __init__(self, env, job, task_config):
@@ -32,20 +40,29 @@ class Task(object):
         self.job = job  # 任务所属的作业实例
         self.task_index = task_config.task_index  # 任务索引，用于标识一个任务在作业中的位置
         self.task_config = task_config  # 任务配置对象，包括任务的配置细节，如资源需求、持续时间
-        self._ready = False  # 用于标记任务是否准备好执行（初始为False）
+        self._ready = False  # 用于标记任务是否准备好执行（初始为False，由Job维护）
         self._parents = None # 用于存储任务的父任务列表
 
-        self.task_instances = []  # 任务的实例列表
+        self.create_task_instances()
+        self.next_instance_pointer = 0
 
-        '''
-        根据task_config中的配置信息，为Task创建多个TaskInstance实例，并将它们存储在task_instances列表中
-        '''
+        # 增量计数器，由任务实例的状态转移通知维护，避免每次查询都遍历全部实例
+        self.running_task_instances_number = 0
+        self.finished_task_instances_number = 0
+        # 时间戳聚合同样随状态转移通知维护
+        self.started_timestamp = None
+        self.finished_timestamp = None
 
+    def create_task_instances(self):
+        """
+        根据task_config中的配置信息，为Task创建多个TaskInstance实例，并将它们存储在task_instances列表中
+        :return:
+        """
+        self.task_instances = []  # 任务的实例列表
         # 通过TaskInstanceConfig类（配置类）
-        task_instance_config = TaskInstanceConfig(task_config)
+        task_instance_config = TaskInstanceConfig(self.task_config)
         for task_instance_index in range(int(self.task_config.instances_number)):
             self.task_instances.append(TaskInstance(self.env, self, task_instance_index, task_instance_config))
-        self.next_instance_pointer = 0
 
     @property  # 使用@property装饰器将此方法作为只读属性暴露
     def id(self):
@@ -63,29 +80,42 @@ class Task(object):
 
     @property
     def ready(self):
-        if not self._ready:
-            for p in self.parents:
-                if not p.finished:
-                    return False
-            self._ready = True
+        """
+        任务的所有父任务都已完成时即准备好执行
+        父任务的完成情况由Job增量传播，这里无需再遍历父任务
+        :return:
+        """
         return self._ready
 
+    def task_instance(self, task_instance_index):
+        """
+        返回指定下标的任务实例
+        :param task_instance_index:
+        :return:
+        """
+        return self.task_instances[task_instance_index]
+
     @property
     def running_task_instances(self):
+        """
+        用于获取当前任务Task中所有正在运行的任务实例
+        只有指针之前的实例被调度过，因此只需遍历已启动的实例
+        :return: 返回所有已经开始但尚未完成的任务实例
+        """
         ls = []
-        for task_instance in self.task_instances:
-            if task_instance.started and not task_instance.finished:
+        for task_instance in self.task_instances[:self.next_instance_pointer]:
+            if not task_instance.finished:
                 ls.append(task_instance)
         return ls
 
     @property
     def finished_task_instances(self):
         """
-        用于获取当前任务Task中所有正在运行的任务实例
-        :return: 返回所有已经开始但尚未完成的任务实例
+        用于获取当前任务Task中所有已完成的任务实例
+        :return: 返回所有已完成的任务实例
         """
         ls = []
-        for task_instance in self.task_instances:
+        for task_instance in self.task_instances[:self.next_instance_pointer]:
             if task_instance.finished:
                 ls.append(task_instance)
         return ls
@@ -98,24 +128,48 @@ class Task(object):
         :param machine:
         :return:
         """
-        # schedule()方法将任务实例分配给指定的machine
-        self.task_instances[self.next_instance_pointer].schedule(machine)
+        task_instance = self.task_instances[self.next_instance_pointer]
         # 将任务实例指针推一格
         self.next_instance_pointer += 1
+        # 最后一个等待的实例被取出后，通知作业该任务已不再有等待实例
+        if not self.has_waiting_task_instances:
+            self.job.on_task_waiting_instances_exhausted(self)
+        # schedule()方法将任务实例分配给指定的machine，集群在最后收到实例启动的通知时状态已经完整
+        task_instance.schedule(machine)
 
+    def on_task_instance_started(self, task_instance_index):
+        """
+        任务实例被调度到机器上时由TaskInstance.schedule()调用
+        :param task_instance_index: 启动的任务实例的下标
+        :return:
+        """
+        self.running_task_instances_number += 1
+        if self.started_timestamp is None:
+            # 仿真时钟单调不减，第一个启动的实例即最早开始的实例
+            self.started_timestamp = self.env.now
+        self.job.on_task_instance_started(self)
+
+    def on_task_instance_finished(self, task_instance_index):
+        """
+        任务实例执行完成时由TaskInstance.do_work()调用
+        若这是任务的最后一个实例，则记录完成时间并通知作业该任务已完成，最后再通知实例完成
+        :param task_instance_index: 完成的任务实例的下标
+        :return:
+        """
+        self.running_task_instances_number -= 1
+        self.finished_task_instances_number += 1
+        if self.finished:
+            self.finished_timestamp = self.env.now
+            self.job.on_task_finished(self)
+        self.job.on_task_instance_finished(self)
 
     @property
     def started(self):
         """
-        遍历任务的所有实例
-        如果某个任务实例的started属性为True，表示该任务实例已经开始执行
-        如果没有一个任务实例started属性为True，返回False
+        任务实例按指针顺序被调度，指针大于0即表示至少有一个任务实例已经开始执行
         :return:
         """
-        for task_instance in self.task_instances:
-            if task_instance.started:
-                return True
-        return False
+        return self.next_instance_pointer > 0
 
     @property
     def waiting_task_instances_number(self):
@@ -142,37 +196,10 @@ class Task(object):
         """
         if self.has_waiting_task_instances:
             return False
-        if len(self.running_task_instances) != 0:
+        if self.running_task_instances_number != 0:
             return False
         return True
 
-    @property
-    def started_timestamp(self):
-        """
-        用来获取任务中所有任务实例最早开始时间
-        :return:
-        """
-        t = None
-        for task_instance in self.task_instances:
-            if task_instance.started_timestamp is not None:
-                if (t is None) or (t > task_instance.started_timestamp):
-                    t = task_instance.started_timestamp
-        return t
-
-    @property
-    def finished_timestamp(self):
-        """
-        用来获取任务完成的时间,也就是任务实例中所有任务实例的最晚完成时间
-        :return:
-        """
-        if not self.finished:
-            return None
-        t = None
-        for task_instance in self.task_instances:
-            if (t is None) or (t < task_instance.finished_timestamp):
-                t = task_instance.finished_timestamp
-        return t
-
 
 class Job(object):
     """
@@ -180,6 +207,7 @@ class Job(object):
     env - job所在的仿真环境(env)
     job_config - job的配置信息，包含作业/任务的详细配置 (JobConfig)
     id - 作业的唯一标识符 (str)
+    cluster - 作业所在的集群，由Cluster.add_job()关联 (Cluster)
     tasks_map - 存储作业中所有任务的字典（key - task_index val - Task） (dict)
     tasks - tasks_map中所有任务实例的val (list)
     unfinished_tasks - 作业中所有尚未完成的任务实例 (list)
@@ -190,9 +218,16 @@ class Job(object):
     finished_tasks - 作业中所有已完成的任务实例 (list)
     started - 检查作业中的任务是否已经开始执行 (bool)
     finished - 检查作业中的所有任务是否已经完成 (bool)
-    started_timestamp - 作业中所有任务中最早开始的时间戳 (float)
-    finished_timestamp - 返回作业中所有任务中最晚完成的时间戳 (float)
+    started_timestamp - 作业中所有任务中最早开始的时间戳，尚未开始为None (float)
+    finished_timestamp - 作业中所有任务中最晚完成的时间戳，作业完成时固定下来，尚未完成为None (float)
+
+    unfinished_tasks、tasks_which_has_waiting_instance、finished_tasks以及两个时间戳由任务的状态转移通知增量维护，
+    查询时无需遍历作业中的全部任务
 
+    依赖引擎：作业记录每个任务尚未完成的父任务数量，父任务完成时向子任务传播，
+    当子任务的最后一个父任务完成时将其标记为ready，并在它仍有等待实例时压入就绪前沿(ready frontier)，
+    ready_tasks_which_has_waiting_instance直接读取该前沿。
+    parent_indices为None的任务视为没有依赖，创建时即准备好执行
 
     """
 
@@ -204,14 +239,111 @@ class Job(object):
         self.env = env
         self.job_config = job_config # job的配置信息
         self.id = job_config.id
+        self.cluster = None
 
         # 字典，用来存储job中所有的任务。键是任务的索引(task_index)
         self.tasks_map = {}
         # 遍历job配置中的所有任务配置，然后逐个创建Task的实例
         for task_config in job_config.task_configs:
             task_index = task_config.task_index
-            # 使用Job.task_cls来创建Task类的实例，并添加到tasks_map中
-            self.tasks_map[task_index] = Job.task_cls(env, self, task_config)
+            # 使用task_cls来创建Task类的实例，并添加到tasks_map中（子类可以替换task_cls）
+            self.tasks_map[task_index] = self.task_cls(env, self, task_config)
+
+        # 增量维护的任务集合（字典保持插入顺序，删除后其余任务的相对顺序不变）
+        self._unfinished_tasks = {}
+        self._tasks_which_has_waiting_instance = {}
+        self._finished_tasks = []
+        for task in self.tasks_map.values():
+            if task.finished:
+                # 实例数为0的任务在创建时就已经完成
+                self._finished_tasks.append(task)
+            else:
+                self._unfinished_tasks[task] = None
+            if task.has_waiting_task_instances:
+                self._tasks_which_has_waiting_instance[task] = None
+        self._started = False
+        self.started_timestamp = None
+        self.finished_timestamp = None
+
+        # 依赖引擎：子任务列表、每个任务尚未完成的父任务数量以及就绪前沿
+        self._children = {}
+        self._unfinished_parents_number = {}
+        self._ready_tasks_which_has_waiting_instance = {}
+        for task in self.tasks_map.values():
+            unfinished_parents_number = 0
+            if task.task_config.parent_indices is not None:
+                for parent in task.parents:
+                    # 已经完成的父任务（实例数为0）不需要再等待
+                    if not parent.finished:
+                        self._children.setdefault(parent, []).append(task)
+                        unfinished_parents_number += 1
+            self._unfinished_parents_number[task] = unfinished_parents_number
+            if unfinished_parents_number == 0:
+                task._ready = True
+                if task.has_waiting_task_instances:
+                    self._ready_tasks_which_has_waiting_instance[task] = None
+
+    def attach(self, cluster):
+        """
+        将作业与集群相关联，之后作业的状态转移会同步通知给集群
+        :param cluster:
+        :return:
+        """
+        self.cluster = cluster
+
+    def on_task_instance_started(self, task):
+        if not self._started:
+            self._started = True
+            self.started_timestamp = task.started_timestamp
+        if self.cluster is not None:
+            self.cluster.on_task_instance_started(task)
+
+    def on_task_instance_finished(self, task):
+        if self.cluster is not None:
+            self.cluster.on_task_instance_finished(task)
+
+    def on_task_waiting_instances_exhausted(self, task):
+        """
+        任务的最后一个等待实例被调度后调用
+        :param task:
+        :return:
+        """
+        del self._tasks_which_has_waiting_instance[task]
+        self._ready_tasks_which_has_waiting_instance.pop(task, None)
+        if self.cluster is not None:
+            self.cluster.on_task_waiting_instances_exhausted(task)
+
+    def on_task_finished(self, task):
+        """
+        任务的全部实例执行完成后调用
+        先将完成事件传播给子任务，再通知集群；若这是作业的最后一个未完成任务，则记录完成时间并继续通知集群作业已完成
+        :param task:
+        :return:
+        """
+        del self._unfinished_tasks[task]
+        self._finished_tasks.append(task)
+        if not self._unfinished_tasks:
+            self.finished_timestamp = task.finished_timestamp
+        for child in self._children.pop(task, ()):
+            self._unfinished_parents_number[child] -= 1
+            if self._unfinished_parents_number[child] == 0:
+                self.on_task_ready(child)
+        if self.cluster is not None:
+            self.cluster.on_task_finished(task)
+            if self.finished:
+                self.cluster.on_job_finished(self)
+
+    def on_task_ready(self, task):
+        """
+        任务的最后一个父任务完成时调用，将任务标记为ready并压入就绪前沿
+        :param task:
+        :return:
+        """
+        task._ready = True
+        if task.has_waiting_task_instances:
+            self._ready_tasks_which_has_waiting_instance[task] = None
+            if self.cluster is not None:
+                self.cluster.on_task_ready(task)
 
     @property
     def tasks(self):
@@ -227,11 +359,7 @@ class Job(object):
         返回job中所有尚未完成的Task实例
         :return:
         """
-        ls = []
-        for task in self.tasks:
-            if not task.finished:
-                ls.append(task)
-        return ls
+        return list(self._unfinished_tasks)
 
     @property
     def ready_unfinished_tasks(self):
@@ -240,83 +368,50 @@ class Job(object):
         :return:
         """
         ls = []
-        for task in self.tasks:
-            if not task.finished and task.ready:
+        for task in self._unfinished_tasks:
+            if task.ready:
                 ls.append(task)
         return ls
 
     @property
     def tasks_which_has_waiting_instance(self):
         """
-        检查每个任务是否有“等待执行的任务实例”，如果有则将该任务添加到返回的列表中
+        返回所有还有“等待执行的任务实例”的任务
         :return:
         """
-        ls = []
-        for task in self.tasks:
-            if task.has_waiting_task_instances:
-                ls.append(task)
-        return ls
+        return list(self._tasks_which_has_waiting_instance)
 
     @property
     def ready_tasks_which_has_waiting_instance(self):
         """
-        遍历任务列表，返回 等待任务实例&&准备好执行 的任务列表
+        返回就绪前沿中 等待任务实例&&准备好执行 的任务列表，按任务就绪的先后顺序排列
         :return:
         """
-        ls = []
-        for task in self.tasks:
-            if task.has_waiting_task_instances and task.ready:
-                ls.append(task)
-        return ls
+        return list(self._ready_tasks_which_has_waiting_instance)
 
     @property
     def running_tasks(self):
         ls = []
-        for task in self.tasks:
-            if task.started and not task.finished:
+        for task in self._unfinished_tasks:
+            if task.started:
                 ls.append(task)
         return ls
 
     @property
     def finished_tasks(self):
-        ls = []
-        for task in self.tasks:
-            if task.finished:
-                ls.append(task)
-        return ls
+        """
+        返回job中所有已完成的任务，按完成的先后顺序排列
+        :return:
+        """
+        return list(self._finished_tasks)
 
     @property
     def started(self):
-        for task in self.tasks:
-            if task.started:
-                return True
-        return False
+        return self._started
 
     @property
     def finished(self):
-        for task in self.tasks:
-            if not task.finished:
-                return False
-        return True
-
-    @property
-    def started_timestamp(self):
-        t = None
-        for task in self.tasks:
-            if task.started_timestamp is not None:
-                if (t is None) or (t > task.started_timestamp):
-                    t = task.started_timestamp
-        return t
-
-    @property
-    def finished_timestamp(self):
-        if not self.finished:
-            return None
-        t = None
-        for task in self.tasks:
-            if (t is None) or (t < task.finished_timestamp):
-                t = task.finished_timestamp
-        return t
+        return len(self._unfinished_tasks) == 0
 
 
 class TaskInstance(object):
@@ -381,6 +476,7 @@ class TaskInstance(object):
         self.finished_timestamp = self.env.now
 
         self.machine.stop_task_instance(self)
+        self.task.on_task_instance_finished(self.task_instance_index)
 
     def schedule(self, machine):
         """
@@ -394,4 +490,138 @@ class TaskInstance(object):
 
         self.machine = machine
         self.machine.run_task_instance(self)
+        self.task.on_task_instance_started(self.task_instance_index)
         self.process = self.env.process(self.do_work())
+
+
+class CompactTask(Task):
+    """
+
+    紧凑模式的任务：同一任务的所有实例完全相同，因此不再为每个实例创建TaskInstance对象，
+    而是用计数器和数组记录实例的状态
+
+    started_timestamps - 每个实例开始执行的时间戳，尚未开始为nan (np.ndarray)
+    finished_timestamps - 每个实例完成的时间戳，尚未完成为nan (np.ndarray)
+    machine_ids - 每个实例所在机器的id，尚未调度为-1 (np.ndarray)
+
+    同一时刻启动的实例共享一个完成事件，不再为每个实例创建simpy进程
+    TaskInstance对象只在被访问时（task_instances、running_task_instances等）才创建，
+    创建后会被缓存并随数组同步更新，但它只是只读视图，不能再调用schedule()
+
+    """
+
+    def create_task_instances(self):
+        instances_number = int(self.task_config.instances_number)
+        self.started_timestamps = np.full(instances_number, np.nan)
+        self.finished_timestamps = np.full(instances_number, np.nan)
+        self.machine_ids = np.full(instances_number, -1, dtype=np.int64)
+        self._machines = {}  # machine id -> Machine
+        self._task_instance_config = None
+        self._materialized_task_instances = {}  # 已创建的TaskInstance视图
+        self._batch = None  # 当前时刻启动的实例 (启动时间, 实例下标列表, 完成事件)
+
+    @property
+    def task_instances(self):
+        return [self.task_instance(index) for index in range(len(self.started_timestamps))]
+
+    def task_instance(self, task_instance_index):
+        """
+        返回指定下标的任务实例视图，第一次访问时创建
+        :param task_instance_index:
+        :return:
+        """
+        task_instance = self._materialized_task_instances.get(task_instance_index)
+        if task_instance is None:
+            if self._task_instance_config is None:
+                self._task_instance_config = TaskInstanceConfig(self.task_config)
+            task_instance = TaskInstance(self.env, self, task_instance_index, self._task_instance_config)
+            self._materialized_task_instances[task_instance_index] = task_instance
+            self._sync_task_instance(task_instance_index)
+        return task_instance
+
+    def _sync_task_instance(self, task_instance_index):
+        task_instance = self._materialized_task_instances.get(task_instance_index)
+        if task_instance is None:
+            return
+        if not np.isnan(self.started_timestamps[task_instance_index]):
+            task_instance.started = True
+            task_instance.started_timestamp = float(self.started_timestamps[task_instance_index])
+            task_instance.machine = self._machines[self.machine_ids[task_instance_index]]
+        if not np.isnan(self.finished_timestamps[task_instance_index]):
+            task_instance.finished = True
+            task_instance.finished_timestamp = float(self.finished_timestamps[task_instance_index])
+
+    def start_task_instance(self, machine):
+        task_instance_index = self.next_instance_pointer
+        self.next_instance_pointer += 1
+        if not self.has_waiting_task_instances:
+            self.job.on_task_waiting_instances_exhausted(self)
+
+        self.started_timestamps[task_instance_index] = self.env.now
+        self.machine_ids[task_instance_index] = machine.id
+        self._machines[machine.id] = machine
+        machine.run_compact_task_instance(self)
+        self._sync_task_instance(task_instance_index)
+        self.on_task_instance_started(task_instance_index)
+
+        # 同一时刻启动的实例同时完成，共用一个完成事件
+        # 与TaskInstance.do_work()一样，完成事件在当前调度步骤结束后才创建
+        if self._batch is None or self._batch[0] != self.env.now or self._batch[2].processed:
+            task_instance_indices = [task_instance_index]
+            started = self.env.event()
+            started.callbacks.append(lambda _: self.wait_for_task_instances(task_instance_indices))
+            started.succeed()
+            self._batch = (self.env.now, task_instance_indices, started)
+        else:
+            self._batch[1].append(task_instance_index)
+
+    def wait_for_task_instances(self, task_instance_indices):
+        completed = self.env.timeout(self.task_config.duration)
+        completed.callbacks.append(lambda _: self.finish_task_instances(task_instance_indices))
+
+    def finish_task_instances(self, task_instance_indices):
+        """
+        一批同时启动的实例执行完成，按启动顺序逐个释放资源并发出通知
+        :param task_instance_indices:
+        :return:
+        """
+        for task_instance_index in task_instance_indices:
+            self.finished_timestamps[task_instance_index] = self.env.now
+            self._machines[self.machine_ids[task_instance_index]].stop_compact_task_instance(self, task_instance_index)
+            self._sync_task_instance(task_instance_index)
+            self.on_task_instance_finished(task_instance_index)
+
+    @property
+    def running_task_instances(self):
+        started = slice(0, self.next_instance_pointer)
+        return [self.task_instance(index) for index in np.flatnonzero(np.isnan(self.finished_timestamps[started]))]
+
+    @property
+    def finished_task_instances(self):
+        return [self.task_instance(index) for index in np.flatnonzero(~np.isnan(self.finished_timestamps))]
+
+    def running_task_instances_on(self, machine):
+        """
+        返回在指定机器上正在运行的任务实例
+        :param machine:
+        :return:
+        """
+        started = slice(0, self.next_instance_pointer)
+        mask = np.isnan(self.finished_timestamps[started]) & (self.machine_ids[started] == machine.id)
+        return [self.task_instance(index) for index in np.flatnonzero(mask)]
+
+    def finished_task_instances_on(self, machine):
+        """
+        返回在指定机器上已完成的任务实例
+        :param machine:
+        :return:
+        """
+        mask = ~np.isnan(self.finished_timestamps) & (self.machine_ids == machine.id)
+        return [self.task_instance(index) for index in np.flatnonzero(mask)]
+
+
+class CompactJob(Job):
+    """
+    由紧凑任务(CompactTask)组成的作业，将Broker.job_cls设为CompactJob即可启用紧凑模式
+    """
+    task_cls = CompactTask
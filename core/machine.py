@@ -10,8 +10,20 @@ cpu - 当前剩余的cpu容量
 memory - 当前剩余的内存容量
 disk - 当前剩余的磁盘容量
 cluster - 机器所在的集群
-task_instances - 机器上正在运行的所有任务实例，每个任务实例都会消耗一定的机器资源
+task_instances - 机器上正在运行的任务实例，以及按退役策略保留下来的已完成任务实例
+compact_tasks - 在机器上运行过实例的紧凑任务(CompactTask)及其[正在运行, 已完成]的实例数量，
+                紧凑任务的实例不在task_instances中保存对象
 machine_door - 机器的状态
+finished_task_instances_number - 机器上已完成的任务实例数量 (int)
+finished_task_instances_duration - 机器上已完成的任务实例的执行时间总和 (float)
+
+正在运行的任务实例保存在一个随run/stop增量维护的集合中，查询只需O(正在运行的实例数)
+已完成的任务实例按集群的退役策略(RetirementPolicy)处理：
+KEEP - 保留任务实例对象，finished_task_instances可以返回它们（默认，与原来的行为一致）
+AGGREGATE - 只累加到机器的聚合计数器中，不再保存任务实例对象
+HISTORY - 写入集群的只追加历史存储(TaskInstanceHistory)，并累加到聚合计数器中
+后两种策略下集群同时释放已完成的作业（见Cluster.jobs），已完成的任务实例不再被任何对象引用，
+长时间仿真的内存占用只取决于尚未完成的作业
 
 """
 
@@ -22,6 +34,12 @@ class MachineDoor(Enum):
     NULL = 3  # 机器没有任务正在进行
 
 
+class RetirementPolicy(Enum):
+    KEEP = 0  # 保留已完成的任务实例
+    AGGREGATE = 1  # 折叠为聚合计数器
+    HISTORY = 2  # 写入历史存储
+
+
 class Machine(object):
     def __init__(self, machine_config):
         self.id = machine_config.id
@@ -34,9 +52,22 @@ class Machine(object):
         self.disk = machine_config.disk
 
         self.cluster = None  # 表示机器所在的集群
-        self.task_instances = []  # 用于存储该机器上正在运行的任务实例
+        self._running_task_instances = {}  # 正在运行的任务实例（有序集合）
+        self._finished_task_instances = []  # 按KEEP策略保留的已完成任务实例
+        self.compact_tasks = {}  # 紧凑任务 -> [正在运行的实例数, 已完成的实例数]
+        self.compact_running_task_instances_number = 0
+        self.finished_task_instances_number = 0
+        self.finished_task_instances_duration = 0
         self.machine_door = MachineDoor.NULL  # 刚创建好的机器上没有任务正在运行
 
+    @property
+    def retirement_policy(self):
+        return RetirementPolicy.KEEP if self.cluster is None else self.cluster.retirement_policy
+
+    @property
+    def task_instances(self):
+        return list(self._running_task_instances) + self._finished_task_instances
+
     def run_task_instance(self, task_instance):
         """
         将一个任务实例运行在当前机器上
@@ -44,14 +75,9 @@ class Machine(object):
         :return:
         """
 
-        # 减少机器的资源来模拟任务实例的资源消耗
-        self.cpu -= task_instance.cpu
-        self.memory -= task_instance.memory
-        self.disk -= task_instance.disk
-        # 将任务实例添加到task_instance中
-        self.task_instances.append(task_instance)
-        # 接收到任务实例的机器改变了机器状态
-        self.machine_door = MachineDoor.TASK_IN
+        self.allocate(task_instance.cpu, task_instance.memory, task_instance.disk)
+        # 将任务实例添加到正在运行的集合中
+        self._running_task_instances[task_instance] = None
 
     def stop_task_instance(self, task_instance):
         """
@@ -59,10 +85,80 @@ class Machine(object):
         :param task_instance:
         :return:
         """
-        self.cpu += task_instance.cpu
-        self.memory += task_instance.memory
-        self.disk += task_instance.disk
+        self.release(task_instance.cpu, task_instance.memory, task_instance.disk)
+        del self._running_task_instances[task_instance]
+        self.finished_task_instances_number += 1
+        self.finished_task_instances_duration += task_instance.finished_timestamp - task_instance.started_timestamp
+
+        retirement_policy = self.retirement_policy
+        if retirement_policy is RetirementPolicy.KEEP:
+            self._finished_task_instances.append(task_instance)
+        elif retirement_policy is RetirementPolicy.HISTORY:
+            self.cluster.task_instance_history.append(
+                task_instance.id, self.id, task_instance.started_timestamp, task_instance.finished_timestamp,
+                task_instance.cpu, task_instance.memory, task_instance.disk)
+
+    def run_compact_task_instance(self, task):
+        """
+        在当前机器上运行紧凑任务的一个实例，只记录数量，不保存实例对象
+        :param task:
+        :return:
+        """
+        self.allocate(task.task_config.cpu, task.task_config.memory, task.task_config.disk)
+        self.compact_tasks.setdefault(task, [0, 0])[0] += 1
+        self.compact_running_task_instances_number += 1
+
+    def stop_compact_task_instance(self, task, task_instance_index):
+        """
+        紧凑任务的一个实例执行完成，释放资源并按退役策略处理
+        :param task:
+        :param task_instance_index: 实例在任务中的下标
+        :return:
+        """
+        self.release(task.task_config.cpu, task.task_config.memory, task.task_config.disk)
+        counts = self.compact_tasks[task]
+        counts[0] -= 1
+        counts[1] += 1
+        self.compact_running_task_instances_number -= 1
+        self.finished_task_instances_number += 1
+        started_timestamp = float(task.started_timestamps[task_instance_index])
+        finished_timestamp = float(task.finished_timestamps[task_instance_index])
+        self.finished_task_instances_duration += finished_timestamp - started_timestamp
+
+        retirement_policy = self.retirement_policy
+        if retirement_policy is not RetirementPolicy.KEEP and counts[0] == 0:
+            # 不再保留该紧凑任务在本机上的记录
+            del self.compact_tasks[task]
+        if retirement_policy is RetirementPolicy.HISTORY:
+            self.cluster.task_instance_history.append(
+                str(task.id) + '-' + str(task_instance_index), self.id, started_timestamp, finished_timestamp,
+                task.task_config.cpu, task.task_config.memory, task.task_config.disk)
+
+    def allocate(self, cpu, memory, disk):
+        """
+        减少机器的资源来模拟任务实例的资源消耗
+        :return:
+        """
+        self.cpu -= cpu
+        self.memory -= memory
+        self.disk -= disk
+        # 接收到任务实例的机器改变了机器状态
+        self.machine_door = MachineDoor.TASK_IN
+        # 同步集群的空闲容量索引
+        if self.cluster is not None:
+            self.cluster.capacity_index.update(self)
+
+    def release(self, cpu, memory, disk):
+        """
+        释放任务实例占用的资源
+        :return:
+        """
+        self.cpu += cpu
+        self.memory += memory
+        self.disk += disk
         self.machine_door = MachineDoor.TASK_OUT  # 将机器的状态设置为Task_Out表示机器任务完成
+        if self.cluster is not None:
+            self.cluster.capacity_index.update(self)
 
     @property
     def running_task_instances(self):
@@ -70,24 +166,29 @@ class Machine(object):
         返回机器上所有正在运行的任务实例，即已经启动但尚未完成的任务实例
         :return: 正在运行的任务实例（list）
         """
-        ls = []
-        for task_instance in self.task_instances:
-            if task_instance.started and not task_instance.finished:
-                ls.append(task_instance)
+        ls = list(self._running_task_instances)
+        for task, (running_number, _) in self.compact_tasks.items():
+            if running_number > 0:
+                ls.extend(task.running_task_instances_on(self))
         return ls
 
     @property
     def finished_task_instances(self):
         """
         返回机器上所有已完成的任务实例 (list)
+        退役策略不是KEEP时，已完成的任务实例不再保存，这里只能返回空列表，数量见finished_task_instances_number
         :return:
         """
-        ls = []
-        for task_instance in self.task_instances:
-            if task_instance.finished:
-                ls.append(task_instance)
+        ls = list(self._finished_task_instances)
+        for task, (_, finished_number) in self.compact_tasks.items():
+            if finished_number > 0:
+                ls.extend(task.finished_task_instances_on(self))
         return ls
 
+    @property
+    def running_task_instances_number(self):
+        return len(self._running_task_instances) + self.compact_running_task_instances_number
+
     def attach(self, cluster):
         """
         将当前机器附加到一个集群中
@@ -137,8 +238,8 @@ class Machine(object):
             'cpu': self.cpu / self.cpu_capacity,
             'memory': self.memory / self.memory_capacity,
             'disk': self.disk / self.disk_capacity,
-            'running_task_instances': len(self.running_task_instances),
-            'finished_task_instances': len(self.finished_task_instances)
+            'running_task_instances': self.running_task_instances_number,
+            'finished_task_instances': self.finished_task_instances_number
         }
 
     def __eq__(self, other):
@@ -1,40 +1,432 @@
+import gzip
 import json
+import os
+from enum import Enum
+import numpy as np
+
+"""
+
+定义了Monitor类以及它使用的记录写出器(writer)
+
+JsonWriter - 在内存中保存整个仿真过程的记录，结束时一次性写成json数组（原来的行为）
+JsonLinesWriter - 每条记录一行(JSON Lines)，缓冲区写满后立即写出，内存占用与仿真时长无关，
+                  仿真中途崩溃时已经写出的记录仍然可读
+ColumnarWriter - 列式存储(.columns目录)，机器的静态信息只写一次，每个时刻的数据分块追加到各列的原始数组文件中，
+                 与上一条保存的记录相同的时刻只记录时间戳（游程编码），读取时用mmap映射，不需要解析json
+
+Monitor按采样策略(SamplingPolicy)决定在哪些时刻记录集群状态：
+INTERVAL - 每隔interval个时间单位记录一次（默认interval为1，与原来的行为一致）
+ON_CHANGE - 仍按interval唤醒，但只在上一次记录之后集群状态发生了变化（作业到达、任务实例启动/完成）时才读取
+            Cluster.state并记录，得到的记录是INTERVAL策略记录的子集
+ADAPTIVE - 集群的资源使用率连续steady_records次记录都保持稳定后，采样间隔加倍（不超过max_interval），
+           使用率发生变化时恢复为interval
+无论使用哪种策略，仿真结束时都会记录最终状态
+
+"""
+
+
+class JsonWriter(object):
+    """
+
+    filename - 输出文件
+    events - 整个仿真过程的记录 (list)
+
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.events = []
+
+    def write(self, record):
+        self.events.append(record)
+
+    def close(self):
+        with open(self.filename, 'w') as f:
+            json.dump(self.events, f, indent=4)
+
+    @staticmethod
+    def read(filename):
+        with open(filename) as f:
+            for record in json.load(f):
+                yield record
+
+
+class JsonLinesWriter(object):
+    """
+
+    filename - 输出文件，以.gz结尾时默认压缩
+    buffer_size - 缓冲区最多保存的记录数，写满后写出到文件 (int)
+    compress - 是否使用gzip压缩 (bool)
+
+    每次写出缓冲区后都会flush文件（压缩时为gzip的同步flush），因此文件中总是包含完整的记录
+
+    """
+
+    def __init__(self, filename, buffer_size=64, compress=None):
+        self.filename = filename
+        self.buffer_size = buffer_size
+        self.compress = filename.endswith('.gz') if compress is None else compress
+        self.file = gzip.open(filename, 'wt') if self.compress else open(filename, 'w')
+        self.buffer = []
+
+    def write(self, record):
+        self.buffer.append(json.dumps(record))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write('\n'.join(self.buffer) + '\n')
+            self.buffer = []
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    @staticmethod
+    def read(filename):
+        """
+        逐条读回记录，文件不完整（例如仿真中途崩溃）时只返回完整的记录
+        :param filename:
+        :return: 记录的生成器
+        """
+        f = gzip.open(filename, 'rt') if filename.endswith('.gz') else open(filename)
+        with f:
+            try:
+                for line in f:
+                    if line.endswith('\n'):
+                        yield json.loads(line)
+            except EOFError:
+                # 被截断的gzip文件
+                pass
+
+
+class ColumnarWriter(object):
+    """
+
+    filename - 输出目录
+    block_size - 内存中最多缓冲的记录数，写满后追加到各列的文件中 (int)
+
+    目录中的文件：
+    meta.json - 机器的静态信息(machine_id/machine_group/machine_*_capacity)和机器数量，第一条记录时写入
+    timestamps.bin - 所有记录的时间戳，float64，形状为(N,)
+    row_ticks.bin - 每个保存的行对应的记录下标，int64，形状为(R,)，第i条记录的数据是row_ticks中不大于i的最后一行
+    machine_cpu.bin/machine_memory.bin/machine_disk.bin - 各机器剩余资源的比例，形状为(R, M)
+    machine_running_task_instances.bin/machine_finished_task_instances.bin - 各机器的任务实例数量，形状为(R, M)
+    arrived_jobs.bin/unfinished_jobs.bin/.../cpu.bin/memory.bin/disk.bin - 集群的计数器和资源比例，形状为(R,)
+
+    每列都是没有文件头的原始数组，长度由文件大小决定，读取时直接用np.memmap映射；
+    内存占用只与block_size和机器数量有关，仿真中途崩溃时已经写出的块仍然可读
+
+    """
+    machine_static_fields = ['id', 'group', 'cpu_capacity', 'memory_capacity', 'disk_capacity']
+    machine_fields = [('cpu', np.float64), ('memory', np.float64), ('disk', np.float64),
+                      ('running_task_instances', np.int64), ('finished_task_instances', np.int64)]
+    cluster_fields = [('arrived_jobs', np.int64), ('unfinished_jobs', np.int64), ('finished_jobs', np.int64),
+                      ('unfinished_tasks', np.int64), ('finished_tasks', np.int64),
+                      ('running_task_instances', np.int64),
+                      ('cpu', np.float64), ('memory', np.float64), ('disk', np.float64)]
+
+    def __init__(self, filename, block_size=4096):
+        self.filename = filename
+        self.block_size = block_size
+        os.makedirs(filename, exist_ok=True)
+        self.files = {name: open(os.path.join(filename, name + '.bin'), 'wb')
+                      for name in ['timestamps', 'row_ticks'] + ColumnarWriter.series_names()}
+        self.machines_number = None
+        self.buffers = None
+        self.ticks = 0  # 已经写入的记录数
+        self.buffered_ticks = 0  # 缓冲区中的记录数
+        self.buffered_rows = 0  # 缓冲区中的行数
+        self.last_machine_row = None
+        self.last_cluster_row = None
+
+    def start(self, machine_states):
+        """
+        第一条记录时写入机器的静态信息并分配缓冲区
+        :param machine_states:
+        :return:
+        """
+        self.machines_number = len(machine_states)
+        meta = {'machines_number': self.machines_number}
+        for field in ColumnarWriter.machine_static_fields:
+            meta['machine_' + field] = [machine_state[field] for machine_state in machine_states]
+        with open(os.path.join(self.filename, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        self.buffers = {'timestamps': np.zeros(self.block_size, dtype=np.float64),
+                        'row_ticks': np.zeros(self.block_size, dtype=np.int64)}
+        for field, dtype in ColumnarWriter.machine_fields:
+            self.buffers['machine_' + field] = np.zeros((self.block_size, self.machines_number), dtype=dtype)
+        for field, dtype in ColumnarWriter.cluster_fields:
+            self.buffers[field] = np.zeros(self.block_size, dtype=dtype)
+
+    def write(self, record):
+        cluster_state = record['cluster_state']
+        machine_states = cluster_state['machine_states']
+        if self.buffers is None:
+            self.start(machine_states)
+        machine_row = [[machine_state[field] for machine_state in machine_states]
+                       for field, _ in ColumnarWriter.machine_fields]
+        cluster_row = [cluster_state[field] for field, _ in ColumnarWriter.cluster_fields]
+        if self.last_machine_row is None or machine_row != self.last_machine_row or \
+                cluster_row != self.last_cluster_row:
+            row = self.buffered_rows
+            self.buffers['row_ticks'][row] = self.ticks
+            for (field, _), values in zip(ColumnarWriter.machine_fields, machine_row):
+                self.buffers['machine_' + field][row] = values
+            for (field, _), value in zip(ColumnarWriter.cluster_fields, cluster_row):
+                self.buffers[field][row] = value
+            self.buffered_rows += 1
+            self.last_machine_row = machine_row
+            self.last_cluster_row = cluster_row
+        self.buffers['timestamps'][self.buffered_ticks] = record['timestamp']
+        self.buffered_ticks += 1
+        self.ticks += 1
+        # 行数不会超过记录数，因此按记录数判断缓冲区是否写满
+        if self.buffered_ticks == self.block_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffers is None:
+            return
+        self.files['timestamps'].write(self.buffers['timestamps'][:self.buffered_ticks].tobytes())
+        for name in ['row_ticks'] + ColumnarWriter.series_names():
+            self.files[name].write(self.buffers[name][:self.buffered_rows].tobytes())
+        for f in self.files.values():
+            f.flush()
+        self.buffered_ticks = 0
+        self.buffered_rows = 0
+
+    def close(self):
+        if self.buffers is None:
+            # 没有任何记录时也写出meta.json，使目录可以正常读取
+            self.start([])
+        self.flush()
+        for f in self.files.values():
+            f.close()
+
+    @staticmethod
+    def column_dtypes():
+        dtypes = {'timestamps': np.float64, 'row_ticks': np.int64}
+        for field, dtype in ColumnarWriter.machine_fields:
+            dtypes['machine_' + field] = dtype
+        for field, dtype in ColumnarWriter.cluster_fields:
+            dtypes[field] = dtype
+        return dtypes
+
+    @staticmethod
+    def load(filename, expand=True):
+        """
+        以mmap方式打开列式目录中的全部数组，不读取数据本身
+        :param filename:
+        :param expand: 为True时把每一行展开到它覆盖的所有记录上（会把数据读入内存），所有逐时刻的数组第一维都与timestamps相同
+        :return: 数组名 -> np.ndarray (dict)
+        """
+        with open(os.path.join(filename, 'meta.json')) as f:
+            meta = json.load(f)
+        machines_number = meta['machines_number']
+        arrays = {}
+        for field in ColumnarWriter.machine_static_fields:
+            arrays['machine_' + field] = np.array(meta['machine_' + field])
+        for name, dtype in ColumnarWriter.column_dtypes().items():
+            width = machines_number if name.startswith('machine_') else 1
+            row_size = np.dtype(dtype).itemsize * width
+            length = os.path.getsize(os.path.join(filename, name + '.bin')) // row_size if row_size else 0
+            shape = (length, machines_number) if name.startswith('machine_') else (length,)
+            if length == 0:
+                arrays[name] = np.zeros(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(os.path.join(filename, name + '.bin'), dtype, 'r', shape=shape)
+        # 中途崩溃时各列写出的长度可能不同，只保留所有列都完整的行
+        rows_number = min(len(arrays[name]) for name in ['row_ticks'] + ColumnarWriter.series_names())
+        for name in ['row_ticks'] + ColumnarWriter.series_names():
+            arrays[name] = arrays[name][:rows_number]
+        if expand:
+            rows = ColumnarWriter.rows_of(arrays.pop('row_ticks'), np.arange(len(arrays['timestamps'])))
+            for name in ColumnarWriter.series_names():
+                arrays[name] = arrays[name][rows]
+        return arrays
+
+    @staticmethod
+    def series_names():
+        """
+        返回所有逐时刻的数组名
+        :return:
+        """
+        return ['machine_' + field for field, _ in ColumnarWriter.machine_fields] + \
+            [field for field, _ in ColumnarWriter.cluster_fields]
+
+    @staticmethod
+    def rows_of(row_ticks, ticks):
+        """
+        返回每个记录下标对应的保存行
+        :param row_ticks:
+        :param ticks:
+        :return:
+        """
+        return np.searchsorted(row_ticks, ticks, side='right') - 1
+
+    @staticmethod
+    def window(arrays, first, last, names=None):
+        """
+        取出记录下标在[first, last)内的数据，只读取row_ticks上的二分查找路径和覆盖这些记录的行
+        :param arrays: load(expand=False)的结果
+        :param first:
+        :param last:
+        :param names: 需要读取的逐时刻数组，默认为全部
+        :return: 数组名 -> np.ndarray (dict)，逐时刻的数组第一维为last - first
+        """
+        window = {'machine_' + field: arrays['machine_' + field] for field in ColumnarWriter.machine_static_fields}
+        window['timestamps'] = np.asarray(arrays['timestamps'][first:last])
+        names = ColumnarWriter.series_names() if names is None else names
+        if last <= first:
+            for name in names:
+                window[name] = arrays[name][:0]
+            return window
+        row_ticks = arrays['row_ticks']
+        first_row = int(ColumnarWriter.rows_of(row_ticks, first))
+        last_row = int(ColumnarWriter.rows_of(row_ticks, last - 1)) + 1
+        rows = ColumnarWriter.rows_of(np.asarray(row_ticks[first_row:last_row]), np.arange(first, last))
+        for name in names:
+            window[name] = np.asarray(arrays[name][first_row:last_row])[rows]
+        return window
+
+    @staticmethod
+    def read(filename):
+        """
+        逐条还原成与JsonWriter相同结构的记录
+        :param filename:
+        :return: 记录的生成器
+        """
+        arrays = ColumnarWriter.load(filename)
+        for tick, timestamp in enumerate(arrays['timestamps']):
+            yield ColumnarWriter.record(arrays, tick, timestamp)
+
+    @staticmethod
+    def record(arrays, tick, timestamp):
+        machine_states = []
+        for m in range(len(arrays['machine_id'])):
+            machine_state = {field: arrays['machine_' + field][m].item()
+                             for field in ColumnarWriter.machine_static_fields}
+            for field, _ in ColumnarWriter.machine_fields:
+                machine_state[field] = arrays['machine_' + field][tick, m].item()
+            machine_states.append(machine_state)
+        cluster_state = {}
+        for field, _ in ColumnarWriter.cluster_fields[:6]:
+            cluster_state[field] = arrays[field][tick].item()
+        cluster_state['machine_states'] = machine_states
+        for field, _ in ColumnarWriter.cluster_fields[6:]:
+            cluster_state[field] = arrays[field][tick].item()
+        timestamp = timestamp.item()
+        return {'timestamp': int(timestamp) if timestamp.is_integer() else timestamp, 'cluster_state': cluster_state}
+
+
+def writer_for(filename):
+    """
+    按文件名选择写出器：.jsonl/.jsonl.gz使用JsonLinesWriter，.columns使用ColumnarWriter，其余使用JsonWriter
+    :param filename:
+    :return:
+    """
+    if filename.endswith('.jsonl') or filename.endswith('.jsonl.gz'):
+        return JsonLinesWriter(filename)
+    if filename.endswith('.columns'):
+        return ColumnarWriter(filename)
+    return JsonWriter(filename)
+
+
+class SamplingPolicy(Enum):
+    INTERVAL = 0
+    ON_CHANGE = 1
+    ADAPTIVE = 2
 
 
 class Monitor(object):
     """
-    Monitor类被用于监控整个模拟过程，并将集群的状态记录写到json文件中
+    Monitor类被用于监控整个模拟过程，并将集群的状态记录交给writer写到文件中
+
+    writer - 记录写出器，默认按event_file的文件名选择 (JsonWriter/JsonLinesWriter/ColumnarWriter)
+    sampling_policy - 采样策略 (SamplingPolicy)
+    interval - 采样间隔 (int)
+    steady_threshold - ADAPTIVE策略下，cpu/内存/磁盘使用率的变化都不超过该值即视为稳定 (float)
+    steady_records - ADAPTIVE策略下，连续稳定多少次记录后加倍采样间隔 (int)
+    max_interval - ADAPTIVE策略下的最大采样间隔 (int)
+
+    以上参数可以通过Episode/Simulation的monitor_kwargs传入，也可以在Simulation.run()之前修改
 
     """
-    def __init__(self, simulation):
+    def __init__(self, simulation, writer=None, sampling_policy=None, interval=1,
+                 steady_threshold=0.01, steady_records=10, max_interval=64):
         self.simulation = simulation
         self.env = simulation.env
         self.event_file = simulation.event_file
-        self.events = []
+        self.writer = writer_for(self.event_file) if writer is None else writer
+        self.sampling_policy = SamplingPolicy.INTERVAL if sampling_policy is None else sampling_policy
+        self.interval = interval
+        self.steady_threshold = steady_threshold
+        self.steady_records = steady_records
+        self.max_interval = max_interval
+
+        self.changed = True  # 上一次记录之后集群状态是否发生了变化
+
+    def notify(self, event):
+        """
+        集群状态变化的监听者，仅ON_CHANGE策略使用
+        :param event: ClusterEvent
+        :return:
+        """
+        self.changed = True
 
     def run(self):
         """
         Monitor核心方法
-        在模拟过程中不断检查集群的状态，并记录每个时间步的状态
+        在模拟过程中按采样策略检查集群的状态并记录
         时间 + 集群状态
         :return:
         """
+        if self.sampling_policy is SamplingPolicy.ON_CHANGE:
+            self.simulation.cluster.add_listener(self.notify)
+
+        interval = self.interval
+        steady = 0
+        last_usage = None
         while not self.simulation.finished:
-            state = {
-                'timestamp': self.env.now,
-                'cluster_state': self.simulation.cluster.state
-            }
-            self.events.append(state)
-            yield self.env.timeout(1)
-
-        state = {
-            'timestamp': self.env.now,
-            'cluster_state': self.simulation.cluster.state
-        }
-        self.events.append(state)
+            if self.sampling_policy is SamplingPolicy.ON_CHANGE and not self.changed:
+                yield self.env.timeout(interval)
+                continue
+
+            state = self.record()
+            if self.sampling_policy is SamplingPolicy.ADAPTIVE:
+                usage = (state['cpu'], state['memory'], state['disk'])
+                if last_usage is not None and \
+                        max(abs(a - b) for a, b in zip(usage, last_usage)) <= self.steady_threshold:
+                    steady += 1
+                    if steady >= self.steady_records:
+                        interval = min(interval * 2, self.max_interval)
+                        steady = 0
+                else:
+                    interval = self.interval
+                    steady = 0
+                last_usage = usage
+            yield self.env.timeout(interval)
+
+        self.record()
 
         self.write_to_file()
 
+    def record(self):
+        """
+        记录当前时刻的集群状态
+        :return: 集群状态
+        """
+        self.changed = False
+        cluster_state = self.simulation.cluster.state
+        self.writer.write({
+            'timestamp': self.env.now,
+            'cluster_state': cluster_state
+        })
+        return cluster_state
+
     def write_to_file(self):
-        with open(self.event_file, 'w') as f:
-            json.dump(self.events, f, indent=4)
+        self.writer.close()
@@ -1,3 +1,9 @@
+import heapq
+import math
+
+from core.cluster import ClusterEvent
+
+
 class Scheduler(object):
     """
 
@@ -7,10 +13,19 @@ class Scheduler(object):
     cluster - 调度器所管理的计算集群，包含所有机器和作业信息
     destroyed - 标记调度器是否已被销毁
     valid_pairs - 字典。存储有效的机器和任务对
+    event_driven - 是否使用事件驱动模式 (bool)
+    min_interval - 事件驱动模式下两次决策之间的最小间隔，决策时刻对齐到min_interval的整数倍 (float)
+
+    轮询模式下调度器每隔1个时间单位做一次决策
+    事件驱动模式下调度器在集群状态没有变化时休眠，直到有作业到达(Broker.run)或任务实例完成(TaskInstance.do_work)：
+    - min_interval不为0时，调度器根据Broker的下一个提交时间和已启动实例的完成时间算出下一次状态变化的时刻，
+      休眠到其后第一个对齐的时刻。min_interval为1时决策时刻和看到的集群状态都与轮询模式相同，
+      只是跳过了不可能放置任何任务实例的时刻
+    - min_interval为None或0时，调度器监听集群事件，在状态变化的时刻立即决策
 
     """
 
-    def __init__(self, env, algorithm):
+    def __init__(self, env, algorithm, event_driven=False, min_interval=1):
         self.env = env
         self.algorithm = algorithm
         self.simulation = None
@@ -18,6 +33,13 @@ class Scheduler(object):
         self.destroyed = False
         self.valid_pairs = {}
 
+        self.event_driven = event_driven
+        self.min_interval = min_interval
+        self.completion_times = []  # 已启动任务实例的完成时间（小顶堆）
+        self.decision_slot = None  # 上次决策所在的对齐时刻序号
+        self.changed = False  # 上次决策之后集群状态是否发生过变化
+        self.wakeup = None  # 休眠时等待的事件
+
     def attach(self, simulation):
         """
         将调度器与仿真对象关联。通常会绑定到集群及其所有作业和机器
@@ -26,17 +48,80 @@ class Scheduler(object):
         """
         self.simulation = simulation
         self.cluster = simulation.cluster
+        if self.event_driven and not self.min_interval:
+            self.cluster.add_listener(self.notify)
+
+    def notify(self, event):
+        """
+        集群状态变化的回调。实例启动是调度器自己的决策造成的，不需要唤醒
+        :param event:
+        :return:
+        """
+        if event is ClusterEvent.TASK_INSTANCE_STARTED:
+            return
+        self.changed = True
+        if self.wakeup is not None and not self.wakeup.triggered:
+            self.wakeup.succeed()
 
     def make_decision(self):
-        while True:
-            machine, task = self.algorithm(self.cluster, self.env.now)
-            if machine is None or task is None:
-                break
-            else:
+        """
+        向算法索取本时刻的放置决策并依次执行
+        批量决策可能基于同一份资源快照做出，执行前逐个检查任务仍有等待实例且机器仍能容纳，不可行的决策被跳过
+        :return:
+        """
+        for machine, task in self.algorithm.make_decisions(self.cluster, self.env.now):
+            if task.has_waiting_task_instances and machine.accommodate(task):
                 task.start_task_instance(machine)
+                if self.event_driven and self.min_interval:
+                    heapq.heappush(self.completion_times, self.env.now + task.task_config.duration)
+
+    def next_change_time(self):
+        """
+        返回下一次可能改变集群状态的时刻：下一个作业的提交时间或最早的任务实例完成时间，没有则返回None
+        :return:
+        """
+        while self.completion_times and self.completion_times[0] < self.env.now:
+            heapq.heappop(self.completion_times)
+        times = []
+        if self.completion_times:
+            times.append(self.completion_times[0])
+        if self.simulation.task_broker.next_submit_time is not None:
+            times.append(self.simulation.task_broker.next_submit_time)
+        return min(times) if times else None
+
+    def wait_for_changes(self):
+        """
+        事件驱动模式下的休眠
+        :return:
+        """
+        if not self.min_interval:
+            if not self.changed:
+                self.wakeup = self.env.event()
+                yield self.wakeup
+                self.wakeup = None
+            return
+
+        next_change_time = self.next_change_time()
+        if next_change_time is None:
+            # 不会再有任何状态变化，永远休眠
+            yield self.env.event()
+        slot = max(math.ceil(next_change_time / self.min_interval), self.decision_slot + 1)
+        # 先休眠到前一个对齐时刻，并让出该时刻已经排队的事件（如Monitor的记录），
+        # 再从那里创建到决策时刻的timeout，使它与同一时刻其他事件的先后顺序和轮询模式下的tick相同
+        if slot - 1 > self.decision_slot:
+            yield self.env.timeout((slot - 1) * self.min_interval - self.env.now)
+            yield self.env.timeout(0)
+        yield self.env.timeout(slot * self.min_interval - self.env.now)
+        self.decision_slot = slot
 
     def run(self):
+        if self.event_driven and self.min_interval:
+            self.decision_slot = math.ceil(self.env.now / self.min_interval)
         while not self.simulation.finished:
+            self.changed = False
             self.make_decision()
-            yield self.env.timeout(1)
+            if self.event_driven:
+                yield from self.wait_for_changes()
+            else:
+                yield self.env.timeout(1)
         self.destroyed = True
@@ -8,18 +8,19 @@ class Simulation(object):
 
     env - 仿真环境
     cluster - 关联的计算机集群
+    monitor_kwargs - 传给Monitor的其他参数，例如sampling_policy、interval (dict)
 
 
     """
 
-    def __init__(self, env, cluster, task_broker, scheduler, event_file):
+    def __init__(self, env, cluster, task_broker, scheduler, event_file, monitor_kwargs=None):
         self.env = env
         self.cluster = cluster
         self.task_broker = task_broker
         self.scheduler = scheduler
         self.event_file = event_file
         if event_file is not None:
-            self.monitor = Monitor(self)
+            self.monitor = Monitor(self, **({} if monitor_kwargs is None else monitor_kwargs))
 
         self.task_broker.attach(self)
         self.scheduler.attach(self)
@@ -35,4 +36,4 @@ class Simulation(object):
     @property
     def finished(self):
         return self.task_broker.destroyed \
-            and len(self.cluster.unfinished_jobs) == 0
+            and self.cluster.unfinished_jobs_number == 0
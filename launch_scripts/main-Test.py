@@ -3,41 +3,32 @@ from algorithm.heuristic.first_fit import FirstFitAlgorithm
 from algorithm.heuristic.random_algorithm import RandomAlgorithm
 from algorithm.heuristic.tetris import Tetris
 from core.config import MachineConfig
-from utils.Episode import Episode
 from utils.csv_reader import CSVReader
+from utils.parallel_runner import EpisodeSpec, ParallelRunner
 import time
 
-from utils.metricCalculations import average_completion, average_slowdown
-
 machines_number = 3
 jobs_len = 10
 jobs_csv_path = '../jobs_files/jobs.csv'
 event_file = '../monitor_files/monitorTest.json'
 
-machine_configs = [MachineConfig(64, 1, 1) for i in range(machines_number)]
-csv_reader = CSVReader(jobs_csv_path)
-jobs_configs = csv_reader.generate(0, jobs_len)
-
-# 随机调度算法
-tic = time.time()
-algorithm = RandomAlgorithm()
-episode = Episode(machine_configs, jobs_configs, algorithm, event_file)
-episode.run()
-print(
-    f"随机调度 \t结束时间：{episode.env.now}\t算法实际执行时间:{time.time() - tic} \t任务平均完成时间:{average_completion(episode)} \t任务平均慢速度:{average_slowdown(episode)}")
-
-# 首适应算法
-tic = time.time()
-algorithm = FirstFitAlgorithm()
-episode = Episode(machine_configs, jobs_configs, algorithm, event_file)
-episode.run()
-print(
-    f"首适应调度\t结束时间：{episode.env.now}\t算法实际执行时间:{time.time() - tic} \t任务平均完成时间:{average_completion(episode)} \t任务平均慢速度:{average_slowdown(episode)}")
+if __name__ == '__main__':
+    machine_configs = [MachineConfig(64, 1, 1) for i in range(machines_number)]
+    csv_reader = CSVReader(jobs_csv_path)
+    # generate()打印作业窗口的统计信息，试验本身使用共享轨迹的视图
+    csv_reader.generate(0, jobs_len)
+    jobs_configs = csv_reader.arena.view(0, jobs_len)
 
-# Tetris调度算法
-tic = time.time()
-algorithm = Tetris()
-episode = Episode(machine_configs, jobs_configs, algorithm, None)
-episode.run()
-print(
-    f"Tetris调度\t结束时间：{episode.env.now}\t算法实际执行时间:{time.time() - tic} \t任务平均完成时间:{average_completion(episode)} \t任务平均慢速度:{average_slowdown(episode)}")
\ No newline at end of file
+    # 三种调度算法在进程池中并行运行，总耗时取决于最慢的一个
+    # 原来依次运行时随机调度写入的event_file会被之后的首适应调度覆盖，并行运行时只由首适应调度写入，最终内容不变
+    names = ['随机调度', '首适应调度', 'Tetris调度']
+    specs = [EpisodeSpec(RandomAlgorithm, machine_configs, jobs_configs),
+             EpisodeSpec(FirstFitAlgorithm, machine_configs, jobs_configs, event_file=event_file),
+             EpisodeSpec(Tetris, machine_configs, jobs_configs)]
+    tic = time.time()
+    with ParallelRunner(csv_reader.arena) as runner:
+        results = runner.run(specs)
+    for name, result in zip(names, results):
+        print(
+            f"{name}\t结束时间：{result.makespan}\t算法实际执行时间:{result.wall_time} \t任务平均完成时间:{result.average_completion} \t任务平均慢速度:{result.average_slowdown}")
+    print(f"总执行时间:{time.time() - tic}")
@@ -1,21 +1,27 @@
 import simpy
 from core.cluster import Cluster
+from core.machine import RetirementPolicy
 from core.scheduler import Scheduler
 from core.broker import Broker
+from core.job import CompactJob
 from core.simulation import Simulation
 
 
 class Episode(object):
-    def __init__(self, machine_configs, job_configs, algorithm, event_file):
+    def __init__(self, machine_configs, job_configs, algorithm, event_file, event_driven=False, compact=False,
+                 retirement_policy=RetirementPolicy.KEEP, task_instance_history=None, monitor_kwargs=None,
+                 min_interval=1):
         self.env = simpy.Environment()
-        cluster = Cluster()
+        cluster = Cluster(retirement_policy, task_instance_history)
         cluster.add_machines(machine_configs)
 
         task_broker = Broker(self.env, job_configs)
+        if compact:
+            task_broker.job_cls = CompactJob
 
-        scheduler = Scheduler(self.env, algorithm)
+        scheduler = Scheduler(self.env, algorithm, event_driven, min_interval)
 
-        self.simulation = Simulation(self.env, cluster, task_broker, scheduler, event_file)
+        self.simulation = Simulation(self.env, cluster, task_broker, scheduler, event_file, monitor_kwargs)
 
     def run(self):
         self.simulation.run()
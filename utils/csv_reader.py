@@ -1,53 +1,245 @@
-from operator import attrgetter
 import pandas as pd
 import numpy as np
 
-from core.job import JobConfig, TaskConfig
+from utils.job_arena import JobArena, annotate_dag
+from utils.trace_cache import TraceCache, JOB_DTYPE, TASK_DTYPE, TASK_CONFIG_FIELDS
+
+
+class JobConfigList(object):
+    """
+    按需从JobArena创建JobConfig的只读序列，访问过的JobConfig会被缓存，
+    因此只使用轨迹中的一部分作业时不需要为整个轨迹创建对象
+    """
+
+    def __init__(self, arena):
+        self.arena = arena
+        self.job_configs = [None] * len(arena)
+
+    def __len__(self):
+        return len(self.arena)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        job_config = self.job_configs[index]
+        if job_config is None:
+            job_config = self.arena.job_config(index)
+            self.job_configs[index] = job_config
+        return job_config
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
 
 
 class CSVReader(object):
-    def __init__(self, filename):
+    """
+
+    filename - 作业轨迹文件
+    arena - 轨迹的只读存储 (JobArena)
+    jobs - 作业表，按提交时间排序 (np.ndarray, JOB_DTYPE)
+    tasks - 任务表，同一作业的任务连续存放 (np.ndarray, TASK_DTYPE)
+    job_configs - 按提交时间排序的作业配置，提交时间为轨迹中的原始值 (JobConfigList)
+
+    cache为True时优先读取源文件旁边的二进制缓存(TraceCache)，缓存无效时解析CSV并重建缓存
+    轨迹太大无法整体载入时，使用stream()/stream_csv()逐个产生作业配置交给Broker
+
+    """
+
+    def __init__(self, filename, cache=False):
         self.filename = filename
-        df = pd.read_csv(self.filename)
-
-        df.task_id = df.task_id.astype(dtype=int)
-        df.job_id = df.job_id.astype(dtype=int)
-        df.instances_num = df.instances_num.astype(dtype=int)
-
-        job_task_map = {}  # 存储每个job_id对应的任务列表 key-job_id  val-TaskConfig
-        job_submit_time_map = {}  # 存储每个job_id对应的提交时间
-        for i in range(len(df)):
-            series = df.iloc[i]
-            job_id = series.job_id
-            task_id = series.task_id
-            cpu = series.cpu
-            memory = series.memory
-            disk = series.disk
-            duration = series.duration
-            submit_time = series.submit_time
-            instances_num = series.instances_num
-
-            # 如果job_id没有对应的值，则会创建一个空列表
-            task_configs = job_task_map.setdefault(job_id, [])
-            task_configs.append(TaskConfig(task_id, instances_num, cpu, memory, disk, duration))
-            # 记录一下每个job_id的提交时间，创建JobConfig的时候用到
-            job_submit_time_map[job_id] = submit_time
-
-        job_configs = []
-        for job_id, task_configs in job_task_map.items():
-            job_configs.append(JobConfig(job_id, job_submit_time_map[job_id], task_configs))
-        # 根据job提交时间对job_configs列表排序
-        job_configs.sort(key=attrgetter('submit_time'))
-        # 将job_configs结果保存到成员变量中，其他函数还会用到
-        self.job_configs = job_configs
+        arrays = TraceCache(filename).load() if cache else None
+        if arrays is None:
+            arrays = CSVReader.parse(filename)
+            if cache:
+                TraceCache(filename).save(*arrays)
+        self.arena = JobArena(*arrays)
+        self.jobs, self.tasks = self.arena.jobs, self.arena.tasks
+        self.job_configs = JobConfigList(self.arena)
+
+    def stream(self, offset=0, number=None):
+        """
+        按提交时间顺序逐个产生作业配置，提交时间以第一个作业为基准（与generate()相同），
+        每次都创建新的JobConfig且不缓存，与缓存的mmap作业表一起使用时内存占用只取决于正在使用的作业
+        :param offset:
+        :param number: 作业数量，默认到轨迹结束
+        :return: JobConfig的迭代器
+        """
+        return iter(self.arena.view(offset, number))
+
+    @staticmethod
+    def stream_csv(filename, offset=0, number=None, chunksize=100000):
+        """
+        分块读取CSV文件并逐个产生作业配置，不建立整个轨迹的作业表
+        要求CSV中同一作业的行连续存放，且作业按提交时间排序；否则抛出ValueError，此时应改用缓存(CSVReader(cache=True).stream())
+        仓库自带的jobs_files/jobs.csv没有按提交时间排序，只能使用后者
+        :param filename:
+        :param offset:
+        :param number: 作业数量，默认到轨迹结束
+        :param chunksize: 每次读取的行数
+        :return: JobConfig的生成器
+        """
+        submit_time_base = None
+        i = 0
+        for arena in CSVReader._stream_csv_arenas(filename, chunksize):
+            for index in range(len(arena)):
+                if number is not None and i >= offset + number:
+                    return
+                if i >= offset:
+                    if submit_time_base is None:
+                        submit_time_base = arena.jobs['submit_time'][index].item()
+                    yield arena.job_config(index, submit_time_base)
+                i += 1
+
+    @staticmethod
+    def _stream_csv_arenas(filename, chunksize):
+        """
+        每读取一块，就把其中已经完整的作业（最后一个作业可能延续到下一块）解析成一个小的JobArena
+        :param filename:
+        :param chunksize:
+        :return: JobArena的生成器
+        """
+        pending = None  # 可能延续到下一块的作业的行
+        last_submit_time = None
+        seen_job_ids = set()  # 已经产生过的作业，同一作业的行不连续时会在不同的块中再次出现
+        for df in pd.read_csv(filename, chunksize=chunksize):
+            if pending is not None:
+                df = pd.concat([pending, df])
+            job_ids = df.job_id.to_numpy()
+            last_job_start = len(df) - np.argmax(job_ids[::-1] != job_ids[-1]) if (job_ids != job_ids[-1]).any() else 0
+            pending = df.iloc[last_job_start:]
+            if last_job_start > 0:
+                last_submit_time = CSVReader._check_sorted(filename, df.iloc[:last_job_start], last_submit_time,
+                                                            seen_job_ids)
+                yield JobArena(*CSVReader.tables(df.iloc[:last_job_start]))
+        if pending is not None and len(pending) > 0:
+            CSVReader._check_sorted(filename, pending, last_submit_time, seen_job_ids)
+            yield JobArena(*CSVReader.tables(pending))
+
+    @staticmethod
+    def _check_sorted(filename, df, last_submit_time, seen_job_ids):
+        """
+        检查一块中完整的作业按提交时间排序，且没有在之前的块中出现过
+        :param filename:
+        :param df:
+        :param last_submit_time: 上一块最后一个作业的提交时间
+        :param seen_job_ids: 之前的块中出现过的作业，原地加入本块的作业
+        :return: 本块最后一个作业的提交时间
+        """
+        job_ids = df.job_id.to_numpy()
+        ends = np.append(np.flatnonzero(np.diff(job_ids)), len(df) - 1)
+        # 与tables()一致，作业的提交时间取该作业最后一行的提交时间
+        submit_times = df.submit_time.to_numpy(dtype=np.float64)[ends]
+        if last_submit_time is not None:
+            submit_times = np.concatenate([[last_submit_time], submit_times])
+        chunk_job_ids = job_ids[ends].tolist()
+        if np.any(np.diff(submit_times) < 0) or len(set(chunk_job_ids)) != len(chunk_job_ids) or \
+                not seen_job_ids.isdisjoint(chunk_job_ids):
+            raise ValueError('Jobs in %s are not sorted by submit_time.' % filename)
+        seen_job_ids.update(chunk_job_ids)
+        return submit_times[-1]
+
+    @staticmethod
+    def parse(filename):
+        """
+        解析CSV文件
+        :param filename:
+        :return: (jobs, tasks, parents)
+        """
+        return CSVReader.tables(pd.read_csv(filename))
+
+    @staticmethod
+    def task_names(df):
+        """
+        返回任务名称列：task_name列，或者非数值的task_id列，没有名称时返回None
+        :param df:
+        :return:
+        """
+        if 'task_name' in df:
+            return df.task_name.astype(str)
+        if df.task_id.dtype == object:
+            return df.task_id.astype(str)
+        return None
+
+    @staticmethod
+    def parse_task_names(names, job_ids):
+        """
+        按Alibaba轨迹的命名规则解析任务之间的依赖：M3_1_2表示3号任务依赖1号和2号任务，
+        不符合该规则的名称（例如task_xxx）表示没有依赖的独立任务，它们在作业内依次编号为-1、-2……
+        :param names: 任务名称 (pd.Series)
+        :param job_ids: 每行所属的作业 (pd.Series)
+        :return: (task_index, parents_numbers, parents)，按行排列，parents_numbers为-1表示没有依赖信息
+        """
+        matched = names.str.extract(r'^[A-Za-z]+(\d+)((?:_\d+)*)$')
+        is_dag = matched[0].notna().to_numpy()
+        independent_index = -(pd.Series(~is_dag, index=names.index).groupby(job_ids.to_numpy()).cumsum())
+        task_index = np.where(is_dag, matched[0].astype(float).to_numpy(), independent_index.to_numpy(dtype=float))
+
+        parent_lists = matched[1].fillna('').str.split('_').str[1:]
+        parents_numbers = np.where(is_dag, parent_lists.str.len().to_numpy(), -1)
+        parents = np.array([int(parent) for parent_list in parent_lists for parent in parent_list], dtype=np.float64)
+        return task_index, parents_numbers, parents
+
+    @staticmethod
+    def tables(df):
+        """
+        由轨迹的DataFrame建立作业表、任务表和父任务表
+        task_id为数值时没有依赖信息；提供task_name列（或者task_id本身是名称）时从名称中解析依赖，
+        并预先计算每个任务的拓扑层次、upward_rank和作业的关键路径长度
+        :param df:
+        :return: (jobs, tasks, parents)
+        """
+        df = df.reset_index(drop=True)
+        names = CSVReader.task_names(df)
+        if names is None:
+            task_index = df.task_id.to_numpy(dtype=np.float64)
+            row_parents_numbers = np.full(len(df), -1)
+            row_parents = np.zeros(0, dtype=np.float64)
+        else:
+            task_index, row_parents_numbers, row_parents = CSVReader.parse_task_names(names, df.job_id)
+
+        # 按job_id分组：job_codes是每行所属作业按首次出现顺序的编号，稳定排序后同一作业的行连续且保持原来的顺序
+        job_codes, _ = pd.factorize(df.job_id, sort=False)
+        jobs_number = job_codes.max() + 1 if len(job_codes) > 0 else 0
+        rows = np.argsort(job_codes, kind='stable')
+        tasks_numbers = np.bincount(job_codes, minlength=jobs_number)
+        ends = np.cumsum(tasks_numbers)
+        starts = ends - tasks_numbers
+        # 作业的提交时间取该作业最后一行的提交时间
+        job_submit_times = df.submit_time.to_numpy(dtype=np.float64)[rows[ends - 1]]
+        job_ids = df.job_id.to_numpy(dtype=np.float64)[rows[starts]]
+
+        # 根据job提交时间对作业排序（稳定排序，提交时间相同的作业保持首次出现的顺序）
+        job_order = np.argsort(job_submit_times, kind='stable')
+        jobs = np.zeros(jobs_number, dtype=JOB_DTYPE)
+        jobs['job_id'] = job_ids[job_order]
+        jobs['submit_time'] = job_submit_times[job_order]
+        jobs['tasks_number'] = tasks_numbers[job_order]
+        jobs['task_offset'] = np.cumsum(jobs['tasks_number']) - jobs['tasks_number']
+
+        # 任务表按排序后的作业顺序重新排列
+        task_rows = rows[np.arange(len(df)) + np.repeat(starts[job_order] - jobs['task_offset'], jobs['tasks_number'])]
+        tasks = np.zeros(len(df), dtype=TASK_DTYPE)
+        tasks['task_id'] = task_index[task_rows]
+        for field in TASK_CONFIG_FIELDS[1:]:
+            tasks[field] = df[field].to_numpy(dtype=np.float64)[task_rows]
+
+        # 父任务表同样按新的任务顺序重新排列
+        row_parents_counts = np.maximum(row_parents_numbers, 0)
+        row_parent_offsets = np.cumsum(row_parents_counts) - row_parents_counts
+        tasks['parents_number'] = row_parents_numbers[task_rows]
+        parents_counts = row_parents_counts[task_rows]
+        tasks['parent_offset'] = np.cumsum(parents_counts) - parents_counts
+        parents = row_parents[np.arange(parents_counts.sum()) +
+                              np.repeat(row_parent_offsets[task_rows] - tasks['parent_offset'], parents_counts)]
+
+        parents = annotate_dag(jobs, tasks, parents)
+        return jobs, tasks, parents
 
     def generate(self, offset, number):
-        # 确保返回的作业数不超过总数
-        number = number if offset + number < len(self.job_configs) else len(self.job_configs) - offset
-        ret = self.job_configs[offset: offset + number]
-        # 获取子集中的第一个作业，并用它的提交时间作为基准时间
-        the_first_job_config = ret[0]
-        submit_time_base = the_first_job_config.submit_time
+        # 视图会确保返回的作业数不超过总数，并以子集中第一个作业的提交时间作为基准时间，
+        # 每次调用都创建新的JobConfig，不会修改轨迹本身，因此可以反复调用
+        ret = list(self.arena.view(offset, number))
         # 初始化变量来统计任务数量、任务实例数、任务持续时间、任务CPU和内存需求
         tasks_number = 0 # 统计ret中所有作业的任务数量
         task_instances_numbers = []
@@ -55,7 +247,6 @@ class CSVReader(object):
         task_instances_cpu = []
         task_instances_memory = []
         for job_config in ret:
-            job_config.submit_time -= submit_time_base
             tasks_number += len(job_config.task_configs)
             for task_config in job_config.task_configs:
                 task_instances_numbers.append(task_config.instances_number)
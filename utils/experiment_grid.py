@@ -0,0 +1,247 @@
+import argparse
+import csv
+import functools
+import hashlib
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import as_completed
+
+from algorithm.heuristic.DRF import DRF
+from algorithm.heuristic.first_fit import FirstFitAlgorithm
+from algorithm.heuristic.random_algorithm import RandomAlgorithm
+from algorithm.heuristic.tetris import Tetris
+from core.config import MachineConfig
+from core.machine import RetirementPolicy
+from utils.csv_reader import CSVReader
+from utils.parallel_runner import EpisodeSpec, ParallelRunner
+from utils.trace_cache import TraceCache
+
+"""
+
+定义了ExperimentCell、ResultCache和ExperimentGrid类
+
+ExperimentGrid把声明式的参数扫描定义展开成仿真试验，通过ParallelRunner并行运行，
+每个试验的结果以 试验内容的哈希 为键保存在磁盘上：
+重新运行同一个扫描时只计算新增或者发生变化的试验，中断的扫描再次运行时从已完成的试验之后继续
+
+扫描定义是一个dict（通常从json文件读取），除trace外每一项都可以是单个值或者列表，对列表取笛卡尔积：
+{
+    "trace": "jobs_files/jobs.csv",                     # CSV作业轨迹
+    "machines_number": [3, 5],                          # 机器数量
+    "machine_shape": [[64, 1, 1]],                      # 机器的(cpu, memory, disk)容量
+    "jobs": [[0, 10], [0, 40]],                         # 作业窗口(offset, jobs_len)
+    "algorithm": ["first_fit", {"name": "random", "threshold": 0.8}],  # 算法名或者带参数的算法
+    "seed": [0, 1],                                     # 随机数种子，默认为0
+    "episode": {"event_driven": true}                   # 传给Episode的其他参数，不参与展开
+}
+
+试验的键由轨迹内容的哈希、机器配置、作业窗口、算法及其参数、随机数种子和Episode参数共同决定；
+算法实现本身发生变化时需要增加ExperimentGrid.version，使所有已保存的结果失效
+
+用法：python -m utils.experiment_grid <扫描定义.json> [--cache 目录] [--workers 进程数]
+
+"""
+
+
+class ExperimentCell(object):
+    """
+
+    trace - CSV作业轨迹 (str)
+    machines_number - 机器数量 (int)
+    machine_shape - 机器的(cpu, memory, disk)容量 (list)
+    jobs - 作业窗口(offset, jobs_len) (list)
+    algorithm - 算法名 (str)
+    parameters - 算法参数 (dict)
+    seed - 随机数种子 (int)
+    episode_kwargs - 传给Episode的其他参数 (dict)
+
+    """
+
+    def __init__(self, trace, machines_number, machine_shape, jobs, algorithm, parameters, seed, episode_kwargs):
+        self.trace = trace
+        self.machines_number = machines_number
+        self.machine_shape = list(machine_shape)
+        self.jobs = list(jobs)
+        self.algorithm = algorithm
+        self.parameters = parameters
+        self.seed = seed
+        self.episode_kwargs = episode_kwargs
+
+    @property
+    def description(self):
+        return {'trace': self.trace, 'machines_number': self.machines_number, 'machine_shape': self.machine_shape,
+                'jobs': self.jobs, 'algorithm': self.algorithm, 'parameters': self.parameters, 'seed': self.seed,
+                'episode': self.episode_kwargs}
+
+    def key(self, trace_hash):
+        """
+        试验的键，轨迹用内容哈希代替文件名，因此移动或者复制轨迹文件不会使结果失效
+        :param trace_hash:
+        :return: (str)
+        """
+        description = dict(self.description, trace=trace_hash, version=ExperimentGrid.version)
+        return hashlib.sha1(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def spec(self, arena, algorithms):
+        """
+        创建ParallelRunner使用的试验描述
+        :param arena: 轨迹的JobArena
+        :param algorithms: 算法名到算法类的映射
+        :return: EpisodeSpec
+        """
+        machine_configs = [MachineConfig(*self.machine_shape) for _ in range(self.machines_number)]
+        episode_kwargs = dict(self.episode_kwargs)
+        if isinstance(episode_kwargs.get('retirement_policy'), str):
+            episode_kwargs['retirement_policy'] = RetirementPolicy[episode_kwargs['retirement_policy']]
+        algorithm_factory = functools.partial(algorithms[self.algorithm], **self.parameters)
+        return EpisodeSpec(algorithm_factory, machine_configs, arena.view(*self.jobs), self.seed,
+                           episode_kwargs=episode_kwargs)
+
+
+class ResultCache(object):
+    """
+
+    directory - 保存结果的目录，每个试验一个json文件(<键>.json)
+
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.json')
+
+    def get(self, key):
+        """
+        读取保存的结果
+        :param key:
+        :return: (dict)，没有保存过时返回None
+        """
+        try:
+            with open(self.path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, record):
+        """
+        保存结果，先写到临时文件再替换，中断时不会留下不完整的结果
+        :param key:
+        :param record:
+        :return:
+        """
+        with open(self.path(key) + '.tmp', 'w') as f:
+            json.dump(record, f)
+        os.replace(self.path(key) + '.tmp', self.path(key))
+
+
+class ExperimentGrid(object):
+    """
+
+    definition - 扫描定义 (dict)
+    algorithms - 算法名到算法类（或返回算法的可调用对象）的映射，默认为ExperimentGrid.algorithms (dict)
+
+    """
+    version = 1
+    algorithms = {'random': RandomAlgorithm, 'first_fit': FirstFitAlgorithm, 'tetris': Tetris, 'drf': DRF}
+    metrics = ['makespan', 'average_completion', 'average_slowdown']
+
+    def __init__(self, definition, algorithms=None):
+        self.definition = definition
+        self.algorithms = ExperimentGrid.algorithms if algorithms is None else algorithms
+
+    @staticmethod
+    def load(filename):
+        """
+        从json文件读取扫描定义，相对路径的轨迹按扫描定义文件所在的目录解析
+        :param filename:
+        :return: ExperimentGrid
+        """
+        with open(filename) as f:
+            definition = json.load(f)
+        definition['trace'] = os.path.join(os.path.dirname(filename), definition['trace'])
+        return ExperimentGrid(definition)
+
+    @staticmethod
+    def values(definition, name, default=None, scalar=lambda value: not isinstance(value, list)):
+        value = definition.get(name, default)
+        return [value] if scalar(value) else value
+
+    def cells(self):
+        """
+        展开扫描定义
+        :return: ExperimentCell列表
+        """
+        definition = self.definition
+        # machine_shape和jobs本身是列表，只有元素也是列表时才表示多个取值
+        single_value = lambda value: not isinstance(value[0], list)
+        algorithms = []
+        for algorithm in ExperimentGrid.values(definition, 'algorithm'):
+            if isinstance(algorithm, str):
+                algorithm = {'name': algorithm}
+            if algorithm['name'] not in self.algorithms:
+                raise ValueError('Unknown algorithm: %s.' % algorithm['name'])
+            parameters = {name: value for name, value in algorithm.items() if name != 'name'}
+            algorithms.append((algorithm['name'], parameters))
+
+        cells = []
+        for machines_number, machine_shape, jobs, (algorithm, parameters), seed in itertools.product(
+                ExperimentGrid.values(definition, 'machines_number'),
+                ExperimentGrid.values(definition, 'machine_shape', [64, 1, 1], single_value),
+                ExperimentGrid.values(definition, 'jobs', scalar=single_value),
+                algorithms,
+                ExperimentGrid.values(definition, 'seed', 0)):
+            cells.append(ExperimentCell(definition['trace'], machines_number, machine_shape, jobs, algorithm,
+                                        parameters, seed, definition.get('episode', {})))
+        return cells
+
+    def run(self, cache_directory, max_workers=None, progress=None):
+        """
+        运行扫描中所有没有保存过结果的试验，每个试验完成后立即保存结果
+        :param cache_directory: 保存结果的目录
+        :param max_workers: 工作进程数
+        :param progress: 每个试验完成后调用progress(完成数, 需要运行的试验数)
+        :return: 与cells()顺序一致的结果列表，每个结果是试验描述加上各项指标 (list)
+        """
+        cells = self.cells()
+        result_cache = ResultCache(cache_directory)
+        # 读取轨迹时同时建立二进制缓存，轨迹的内容哈希直接取自缓存的meta.json
+        csv_reader = CSVReader(self.definition['trace'], cache=True)
+        trace_hash = TraceCache(self.definition['trace']).source_hash()
+        keys = [cell.key(trace_hash) for cell in cells]
+        records = [result_cache.get(key) for key in keys]
+
+        pending = [i for i, record in enumerate(records) if record is None]
+        if len(pending) > 0:
+            with ParallelRunner(csv_reader.arena, max_workers) as runner:
+                futures = {runner.submit(cells[i].spec(csv_reader.arena, self.algorithms)): i for i in pending}
+                for finished, future in enumerate(as_completed(futures), 1):
+                    i = futures[future]
+                    result = future.result()
+                    records[i] = dict(cells[i].description, wall_time=result.wall_time,
+                                      **{name: getattr(result, name) for name in ExperimentGrid.metrics})
+                    result_cache.put(keys[i], records[i])
+                    if progress is not None:
+                        progress(finished, len(pending))
+        return records
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='运行参数扫描，已保存结果的试验不会重新计算')
+    parser.add_argument('definition', help='扫描定义(json)')
+    parser.add_argument('--cache', help='保存结果的目录，默认为扫描定义文件名加.cache')
+    parser.add_argument('--workers', type=int, help='工作进程数，默认为CPU核数')
+    args = parser.parse_args()
+
+    grid = ExperimentGrid.load(args.definition)
+    records = grid.run(args.cache or args.definition + '.cache', args.workers,
+                       lambda finished, total: print('%d/%d' % (finished, total), file=sys.stderr))
+    columns = ['machines_number', 'machine_shape', 'jobs', 'algorithm', 'parameters', 'seed'] + ExperimentGrid.metrics
+    writer = csv.writer(sys.stdout)
+    writer.writerow(columns)
+    for record in records:
+        writer.writerow([json.dumps(record[column]) if isinstance(record[column], (list, dict)) else record[column]
+                         for column in columns])
@@ -18,8 +18,8 @@ def features_extract_func_ac(task):
     :param task:
     :return:
     """
-    return features_extract_func(task) + [task.task_config.instances_number, len(task.running_task_instances),
-                                          len(task.finished_task_instances)]
+    return features_extract_func(task) + [task.task_config.instances_number, task.running_task_instances_number,
+                                          task.finished_task_instances_number]
 
 
 def features_normalize_func(x):
@@ -0,0 +1,247 @@
+from multiprocessing import shared_memory
+import numpy as np
+
+from core.config import JobConfig, TaskConfig
+from utils.trace_cache import JOB_DTYPE, TASK_DTYPE, TASK_CONFIG_FIELDS, save_tables, load_tables
+
+"""
+
+定义了JobArena类和JobArenaView类
+
+JobArena - 只读的作业轨迹存储：作业表(jobs)、任务表(tasks)和父任务表(parents)三个扁平数组，整个轨迹只保存一份
+JobArenaView - 轨迹中一段连续作业的视图，提交时间在产生JobConfig时按第一个作业重新计算，不修改存储本身
+
+同一个JobArena可以同时供多个Episode使用；跨进程时，可以通过share()把数组放进共享内存，
+子进程用JobArena.attach()按名字取得同一份数据，也可以让每个进程各自mmap同一个二进制缓存(TraceCache)
+
+"""
+
+
+class JobArena(object):
+    """
+
+    jobs - 作业表，按提交时间排序 (np.ndarray, JOB_DTYPE，只读)
+    tasks - 任务表，同一作业的任务连续存放 (np.ndarray, TASK_DTYPE，只读)
+    parents - 父任务表，每个任务的父任务task_index连续存放 (np.ndarray，只读)
+
+    """
+
+    def __init__(self, jobs, tasks, parents=None):
+        self.jobs = JobArena.read_only(jobs)
+        self.tasks = JobArena.read_only(tasks)
+        self.parents = JobArena.read_only(np.zeros(0, dtype=np.float64) if parents is None else parents)
+        self.shared_memories = []  # share()/attach()使用的共享内存
+        self.owner = True  # 是否由本进程创建共享内存
+
+    @staticmethod
+    def read_only(array):
+        if array.flags.writeable:
+            array = array.view()
+            array.flags.writeable = False
+        return array
+
+    @staticmethod
+    def from_csv(filename, cache=False):
+        """
+        从CSV轨迹（或它的二进制缓存）创建JobArena
+        :param filename:
+        :param cache:
+        :return:
+        """
+        from utils.csv_reader import CSVReader
+
+        return CSVReader(filename, cache).arena
+
+    def save(self, directory):
+        """
+        把轨迹写入目录，之后可以用JobArena.load()以mmap方式读取
+        :param directory:
+        :return:
+        """
+        save_tables(directory, (self.jobs, self.tasks, self.parents))
+
+    @staticmethod
+    def load(directory, mmap_mode='r'):
+        return JobArena(*load_tables(directory, mmap_mode))
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def task_configs(self, index):
+        """
+        为第index个作业创建任务配置
+        :param index:
+        :return: (list)
+        """
+        job = self.jobs[index]
+        task_offset, tasks_number = job['task_offset'].item(), job['tasks_number'].item()
+        tasks = self.tasks[task_offset:task_offset + tasks_number]
+        task_configs = []
+        for values, parent_offset, parents_number, level, upward_rank in zip(
+                tasks[TASK_CONFIG_FIELDS].tolist(), tasks['parent_offset'].tolist(),
+                tasks['parents_number'].tolist(), tasks['level'].tolist(), tasks['upward_rank'].tolist()):
+            parent_indices = None if parents_number < 0 else \
+                self.parents[parent_offset:parent_offset + parents_number].tolist()
+            task_configs.append(TaskConfig(*values, parent_indices, level, upward_rank))
+        return task_configs
+
+    def job_config(self, index, submit_time_base=0, task_configs=None):
+        """
+        为第index个作业创建作业配置
+        :param index:
+        :param submit_time_base: 提交时间的基准，作业配置的提交时间为轨迹中的提交时间减去该基准
+        :param task_configs: 已经创建好的任务配置，默认重新创建
+        :return: JobConfig
+        """
+        job = self.jobs[index]
+        if task_configs is None:
+            task_configs = self.task_configs(index)
+        return JobConfig(job['job_id'].item(), job['submit_time'].item() - submit_time_base, task_configs,
+                         job['critical_path_length'].item())
+
+    def view(self, offset=0, number=None):
+        """
+        返回从offset开始的number个作业的视图
+        :param offset:
+        :param number: 作业数量，默认到轨迹结束
+        :return: JobArenaView
+        """
+        end = len(self) if number is None else min(offset + number, len(self))
+        return JobArenaView(self, offset, max(end - offset, 0))
+
+    def share(self):
+        """
+        把作业表和任务表复制到共享内存中，返回可以传给子进程的句柄，共享内存随close()释放
+        :return: 句柄 (tuple)
+        """
+        handle = []
+        for array in (self.jobs, self.tasks, self.parents):
+            shared = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=shared.buf)[:] = array
+            self.shared_memories.append(shared)
+            handle.append((shared.name, len(array)))
+        return tuple(handle)
+
+    @staticmethod
+    def attach(handle):
+        """
+        在子进程中按share()返回的句柄取得共享的JobArena，数组直接引用共享内存，不复制
+        子进程应由创建共享内存的进程通过multiprocessing启动，从而与它共用同一个资源跟踪器
+        :param handle:
+        :return: JobArena
+        """
+        shared_memories = []
+        arrays = []
+        for (name, length), dtype in zip(handle, (JOB_DTYPE, TASK_DTYPE, np.float64)):
+            shared = shared_memory.SharedMemory(name=name)
+            shared_memories.append(shared)
+            arrays.append(np.ndarray(length, dtype, buffer=shared.buf))
+        arena = JobArena(*arrays)
+        arena.shared_memories = shared_memories
+        arena.owner = False
+        return arena
+
+    def close(self):
+        """
+        释放share()创建的共享内存；attach()得到的JobArena只断开连接
+        :return:
+        """
+        self.jobs = self.tasks = self.parents = None
+        for shared in self.shared_memories:
+            shared.close()
+            if self.owner:
+                shared.unlink()
+        self.shared_memories = []
+
+
+def annotate_dag(jobs, tasks, parents):
+    """
+    为整个轨迹预先计算DAG信息：删除作业中不存在的父任务，计算每个任务的拓扑层次(level)和upward_rank，
+    以及每个作业的关键路径长度(critical_path_length)
+    所有作业一起按边做向量化的松弛，迭代次数等于最深的DAG层数
+    :param jobs: 作业表，原地写入critical_path_length
+    :param tasks: 任务表，原地写入parent_offset、parents_number、level和upward_rank
+    :param parents: 父任务表
+    :return: 删除了不存在的父任务之后的父任务表
+    """
+    tasks_number = len(tasks)
+    job_of_task = np.repeat(np.arange(len(jobs)), jobs['tasks_number'])
+    parents_numbers = np.maximum(tasks['parents_number'], 0)
+    children = np.repeat(np.arange(tasks_number), parents_numbers)
+    parent_rows = np.full(len(children), -1)
+
+    if len(children) > 0:
+        # 用(作业, task_index)组合成的键查找父任务所在的行
+        task_ids = tasks['task_id']
+        low = task_ids.min()
+        span = task_ids.max() - low + 1
+        keys = job_of_task * span + (task_ids - low)
+        order = np.argsort(keys, kind='stable')
+        edge_keys = job_of_task[children] * span + (parents - low)
+        positions = np.minimum(np.searchsorted(keys[order], edge_keys), tasks_number - 1)
+        found = keys[order][positions] == edge_keys
+        parent_rows[found] = order[positions[found]]
+
+    # 删除不存在的父任务，重建父任务表
+    existing = parent_rows >= 0
+    children, parent_rows, parents = children[existing], parent_rows[existing], parents[existing]
+    kept_numbers = np.bincount(children, minlength=tasks_number)
+    tasks['parents_number'] = np.where(tasks['parents_number'] < 0, -1, kept_numbers)
+    tasks['parent_offset'] = np.cumsum(kept_numbers) - kept_numbers
+
+    max_iterations = int(jobs['tasks_number'].max()) + 1 if len(jobs) > 0 else 1
+    level = np.zeros(tasks_number, dtype=np.int64)
+    duration = tasks['duration']
+    upward_rank = duration.copy()
+    for _ in range(max_iterations):
+        new_level = level.copy()
+        np.maximum.at(new_level, children, level[parent_rows] + 1)
+        new_upward_rank = upward_rank.copy()
+        np.maximum.at(new_upward_rank, parent_rows, duration[parent_rows] + upward_rank[children])
+        if np.array_equal(new_level, level) and np.array_equal(new_upward_rank, upward_rank):
+            break
+        level, upward_rank = new_level, new_upward_rank
+    else:
+        raise ValueError('Task dependencies contain a cycle.')
+    tasks['level'] = level
+    tasks['upward_rank'] = upward_rank
+
+    jobs['critical_path_length'] = 0
+    nonempty = jobs['tasks_number'] > 0
+    if nonempty.any():
+        jobs['critical_path_length'][nonempty] = np.maximum.reduceat(upward_rank, jobs['task_offset'][nonempty])
+    return parents
+
+
+class JobArenaView(object):
+    """
+
+    arena - 所属的JobArena
+    offset - 第一个作业在arena中的位置 (int)
+    submit_time_base - 提交时间的基准，即第一个作业在轨迹中的提交时间 (float)
+
+    视图可以反复迭代，每次迭代都重新创建JobConfig，因此可以同时交给多个Episode的Broker使用
+
+    """
+
+    def __init__(self, arena, offset, number):
+        self.arena = arena
+        self.offset = offset
+        self.number = number
+        self.submit_time_base = arena.jobs['submit_time'][offset].item() if number > 0 else 0
+
+    def __len__(self):
+        return self.number
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += self.number
+        if not 0 <= index < self.number:
+            raise IndexError(index)
+        return self.arena.job_config(self.offset + index, self.submit_time_base)
+
+    def __iter__(self):
+        for i in range(self.number):
+            yield self.arena.job_config(self.offset + i, self.submit_time_base)
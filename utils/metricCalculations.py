@@ -1,17 +1,14 @@
-import time
-import numpy as np
-# import tensorflow as tf
-
-
 def average_completion(exp):
     """
     计算全部任务的平均完成时间
+    已从集群中释放的作业（退役策略不是KEEP）由集群的released_*计数器计入
     :param exp:
     :return:
     """
-    completion_time = 0
-    number_task = 0
-    for job in exp.simulation.cluster.jobs:
+    cluster = exp.simulation.cluster
+    completion_time = cluster.released_tasks_completion_time
+    number_task = cluster.released_tasks_number
+    for job in cluster.jobs:
         for task in job.tasks:
             number_task += 1
             completion_time += (task.finished_timestamp - task.started_timestamp)
@@ -22,33 +19,16 @@ def average_slowdown(exp):
     """
     计算全部任务的平均慢速度
     任务实际执行时间/任务理想执行时间
+    已从集群中释放的作业（退役策略不是KEEP）由集群的released_*计数器计入
     :param exp:
     :return:
     """
-    slowdown = 0
-    number_task = 0
-    for job in exp.simulation.cluster.jobs:
+    cluster = exp.simulation.cluster
+    slowdown = cluster.released_tasks_slowdown
+    number_task = cluster.released_tasks_number
+    for job in cluster.jobs:
         for task in job.tasks:
             number_task += 1
             slowdown += (task.finished_timestamp - task.started_timestamp) / task.task_config.duration
     return slowdown / number_task
 
-
-# def multiprocessing_run(episode, trajectories, makespans, average_completions, average_slowdowns):
-#     """
-#     并行化地运行多个仿真试验，并将每个试验的结果保存在列表中（轨迹、总时间、平均完成时间、慢速度）
-#     :param episode:
-#     :param trajectories:
-#     :param makespans:
-#     :param average_completions:
-#     :param average_slowdowns:
-#     :return:
-#     """
-#     np.random.seed(int(time.time()))
-#     tf.random.set_random_seed(time.time())
-#     episode.run()
-#     trajectories.append(episode.simulation.scheduler.algorithm.current_trajectory)
-#     makespans.append(episode.simulation.env.now)
-#     # print(episode.simulation.env.now)
-#     average_completions.append(average_completion(episode))
-#     average_slowdowns.append(average_slowdown(episode))
@@ -0,0 +1,160 @@
+import json
+import mmap
+import os
+import re
+import numpy as np
+
+from core.monitor import ColumnarWriter, JsonLinesWriter
+
+"""
+
+定义了一个MonitorReader类
+
+按时间范围读取Monitor输出的文件，不需要加载整个文件：
+.json/.jsonl - 第一次打开时扫描一遍文件，建立 时间戳 -> 字节偏移 的旁路索引(filename + '.idx.npz')，
+               之后通过mmap只解析时间范围内的记录；文件的大小或修改时间变化后重新建立索引
+.columns - 列式目录，各列用mmap映射，在时间戳列上二分查找后只读取时间范围内的行
+.jsonl.gz - gzip无法随机访问，只能顺序解压，读到时间范围之后即停止
+
+"""
+
+TIMESTAMP_PATTERN = re.compile(rb'"timestamp":\s*(-?[0-9.eE+-]+)')
+
+
+class MonitorReader(object):
+    """
+
+    filename - Monitor输出的文件
+    timestamps - 所有记录的时间戳 (np.ndarray)
+    offsets - 每条记录在文件中的起始字节偏移，最后一个元素是最后一条记录的结束位置，列式文件为None (np.ndarray)
+
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.arrays = None
+        self.offsets = None
+        if filename.endswith('.columns'):
+            self.arrays = ColumnarWriter.load(filename, expand=False)
+            self.timestamps = self.arrays['timestamps']
+        elif filename.endswith('.gz'):
+            self.timestamps = None
+        else:
+            self.timestamps, self.offsets = self.load_index()
+
+    @property
+    def index_filename(self):
+        return self.filename + '.idx.npz'
+
+    def load_index(self):
+        """
+        读取旁路索引，索引不存在或者与文件的大小、修改时间不一致时重新建立
+        :return: (timestamps, offsets)
+        """
+        stat = os.stat(self.filename)
+        if os.path.exists(self.index_filename):
+            with np.load(self.index_filename) as index:
+                if 'mtime' in index.files and int(index['size']) == stat.st_size and \
+                        int(index['mtime']) == stat.st_mtime_ns:
+                    return index['timestamps'], index['offsets']
+        timestamps, offsets = self.build_index()
+        np.savez(self.index_filename, size=stat.st_size, mtime=stat.st_mtime_ns, timestamps=timestamps,
+                 offsets=offsets)
+        return timestamps, offsets
+
+    def build_index(self):
+        """
+        扫描一遍文件，记录每条记录的起始偏移和时间戳
+        json数组中每条记录都以缩进4个空格的'{'开头（json.dump(indent=4)的输出），jsonl中每行一条记录
+        :return: (timestamps, offsets)
+        """
+        timestamps = []
+        offsets = []
+        with open(self.filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return np.zeros(0), np.zeros(1, dtype=np.int64)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if self.filename.endswith('.jsonl'):
+                    start = 0
+                    while start < len(data):
+                        end = data.find(b'\n', start)
+                        if end == -1:
+                            # 最后一行不完整
+                            break
+                        offsets.append(start)
+                        timestamps.append(float(TIMESTAMP_PATTERN.search(data, start, end).group(1)))
+                        start = end + 1
+                    offsets.append(start)
+                else:
+                    start = data.find(b'\n    {\n')
+                    while start != -1:
+                        offsets.append(start + 1)
+                        timestamps.append(float(TIMESTAMP_PATTERN.search(data, start).group(1)))
+                        start = data.find(b'\n    {\n', start + 1)
+                    offsets.append(data.rfind(b']'))
+        return np.array(timestamps, dtype=np.float64), np.array(offsets, dtype=np.int64)
+
+    def ticks(self, start, end):
+        """
+        返回时间戳在[start, end]内的记录下标范围
+        :param start:
+        :param end:
+        :return: (first, last)，不包含last
+        """
+        return np.searchsorted(self.timestamps, start, side='left'), np.searchsorted(self.timestamps, end, side='right')
+
+    def records(self, start, end):
+        """
+        返回时间戳在[start, end]内的记录，结构与Monitor写出的记录相同
+        :param start:
+        :param end:
+        :return: (list)
+        """
+        if self.timestamps is None:
+            records = []
+            for record in JsonLinesWriter.read(self.filename):
+                if record['timestamp'] > end:
+                    break
+                if record['timestamp'] >= start:
+                    records.append(record)
+            return records
+
+        first, last = self.ticks(start, end)
+        if self.arrays is not None:
+            window = ColumnarWriter.window(self.arrays, first, last)
+            return [ColumnarWriter.record(window, i, timestamp) for i, timestamp in enumerate(window['timestamps'])]
+
+        records = []
+        if first == last:
+            return records
+        with open(self.filename, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for tick in range(first, last):
+                    text = data[self.offsets[tick]:self.offsets[tick + 1]].rstrip(b' \n,')
+                    records.append(json.loads(text))
+        return records
+
+    def machine_series(self, machine_id, field, start, end):
+        """
+        返回一台机器某个字段在[start, end]内的时间序列
+        :param machine_id:
+        :param field: machine.state中的字段，例如'cpu'、'running_task_instances'
+        :param start:
+        :param end:
+        :return: (timestamps, values)
+        """
+        if self.arrays is not None:
+            first, last = self.ticks(start, end)
+            machine_index = int(np.flatnonzero(self.arrays['machine_id'] == machine_id)[0])
+            window = ColumnarWriter.window(self.arrays, first, last, ['machine_' + field])
+            return window['timestamps'], window['machine_' + field][:, machine_index]
+
+        timestamps = []
+        values = []
+        for record in self.records(start, end):
+            for machine_state in record['cluster_state']['machine_states']:
+                if machine_state['id'] == machine_id:
+                    timestamps.append(record['timestamp'])
+                    values.append(machine_state[field])
+                    break
+        return np.array(timestamps, dtype=np.float64), np.array(values)
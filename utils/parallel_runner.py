@@ -0,0 +1,194 @@
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from algorithm.DeepJS.trajectory import Trajectory
+from utils.Episode import Episode
+from utils.job_arena import JobArena, JobArenaView
+from utils.metricCalculations import average_completion, average_slowdown
+
+"""
+
+定义了EpisodeSpec、EpisodeResult和ParallelRunner类
+
+ParallelRunner把多个仿真试验分发到进程池(ProcessPoolExecutor)中并行运行，收集每个试验的总时间(makespan)、
+任务平均完成时间、任务平均慢速度以及（可选的）RL算法轨迹
+
+轨迹只共享一份：ParallelRunner创建时把JobArena放进共享内存，每个工作进程启动时attach一次；
+作业配置为该JobArena的视图(arena.view())时只传递视图的范围，不会为每个试验重新序列化作业配置，
+其他任意的作业配置列表按原样序列化后传给工作进程
+
+每个试验在运行前按自己的seed重置random、numpy（以及已经导入的tensorflow）的随机数种子，
+因此结果只取决于试验本身，与它被分配到哪个工作进程、以什么顺序运行无关
+
+"""
+
+
+class EpisodeSpec(object):
+    """
+
+    algorithm_factory - 在工作进程中创建调度算法的可调用对象，例如算法类或functools.partial，必须可以被pickle
+    machine_configs - 机器配置列表
+    job_configs - 作业配置，JobArenaView或作业配置列表
+    seed - 随机数种子 (int)
+    event_file - Monitor输出文件，None表示不记录 (str)
+    episode_kwargs - 传给Episode的其他参数，例如event_driven、compact、retirement_policy (dict)
+
+    """
+
+    def __init__(self, algorithm_factory, machine_configs, job_configs, seed=0, event_file=None, episode_kwargs=None):
+        self.algorithm_factory = algorithm_factory
+        self.machine_configs = machine_configs
+        self.job_configs = job_configs
+        self.seed = seed
+        self.event_file = event_file
+        self.episode_kwargs = {} if episode_kwargs is None else episode_kwargs
+
+
+class EpisodeResult(object):
+    """
+
+    makespan - 所有作业完成的时刻 (float)
+    average_completion - 任务平均完成时间 (float)
+    average_slowdown - 任务平均慢速度 (float)
+    trajectory - 算法的current_trajectory的紧凑形式，只在collect_trajectories为True时收集 (Trajectory)
+    wall_time - 试验实际运行的时间，单位为秒 (float)
+
+    """
+
+    def __init__(self, makespan, average_completion, average_slowdown, trajectory=None, wall_time=0):
+        self.makespan = makespan
+        self.average_completion = average_completion
+        self.average_slowdown = average_slowdown
+        self.trajectory = trajectory
+        self.wall_time = wall_time
+
+    def __repr__(self):
+        return 'EpisodeResult(makespan=%r, average_completion=%r, average_slowdown=%r)' % (
+            self.makespan, self.average_completion, self.average_slowdown)
+
+
+# 工作进程中attach得到的JobArena
+_arena = None
+
+
+def _attach(handle):
+    global _arena
+    if handle is not None:
+        _arena = JobArena.attach(handle)
+
+
+def seed_everything(seed):
+    """
+    重置random、numpy和已经导入的tensorflow的随机数种子
+    :param seed:
+    :return:
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    tf = sys.modules.get('tensorflow')
+    if tf is not None:
+        if hasattr(tf, 'set_random_seed'):
+            tf.set_random_seed(seed)
+        else:
+            tf.random.set_seed(seed)
+
+
+def run_episode(spec, job_configs, collect_trajectories=False):
+    """
+    在当前进程中运行一个试验
+    :param spec: EpisodeSpec
+    :param job_configs: 作业配置
+    :param collect_trajectories:
+    :return: EpisodeResult
+    """
+    tic = time.time()
+    seed_everything(spec.seed)
+    algorithm = spec.algorithm_factory()
+    episode = Episode(spec.machine_configs, job_configs, algorithm, spec.event_file, **spec.episode_kwargs)
+    if getattr(algorithm, 'reward_giver', None) is not None:
+        algorithm.reward_giver.attach(episode.simulation)
+    episode.run()
+
+    trajectory = None
+    if collect_trajectories and hasattr(algorithm, 'current_trajectory'):
+        trajectory = Trajectory.from_nodes(algorithm.current_trajectory)
+    return EpisodeResult(episode.env.now, average_completion(episode), average_slowdown(episode), trajectory,
+                         time.time() - tic)
+
+
+def _run(spec, job_range, collect_trajectories):
+    job_configs = spec.job_configs if job_range is None else _arena.view(*job_range)
+    return run_episode(spec, job_configs, collect_trajectories)
+
+
+class ParallelRunner(object):
+    """
+
+    arena - 所有试验共享的JobArena，为None时每个试验的作业配置单独序列化 (JobArena)
+    max_workers - 工作进程数，默认为CPU核数 (int)
+    collect_trajectories - 是否收集算法的轨迹 (bool)
+    mp_context - multiprocessing上下文，例如multiprocessing.get_context('spawn')
+
+    可以作为上下文管理器使用，退出时关闭进程池并释放共享内存
+
+    """
+
+    def __init__(self, arena=None, max_workers=None, collect_trajectories=False, mp_context=None):
+        self.arena = arena
+        self.collect_trajectories = collect_trajectories
+        self.shared_arena = None
+        handle = None
+        if arena is not None:
+            # 在主进程中保留一份共享内存的引用，进程池关闭之后再释放
+            self.shared_arena = JobArena(arena.jobs, arena.tasks, arena.parents)
+            handle = self.shared_arena.share()
+        self.executor = ProcessPoolExecutor(max_workers, mp_context, initializer=_attach, initargs=(handle,))
+
+    def job_range(self, job_configs):
+        """
+        作业配置是共享JobArena的视图时返回视图的范围，否则返回None
+        :param job_configs:
+        :return: (offset, number)
+        """
+        if isinstance(job_configs, JobArenaView) and self.arena is not None and job_configs.arena is self.arena:
+            return job_configs.offset, job_configs.number
+        return None
+
+    def submit(self, spec):
+        """
+        提交一个试验
+        :param spec: EpisodeSpec
+        :return: concurrent.futures.Future，结果为EpisodeResult
+        """
+        job_range = self.job_range(spec.job_configs)
+        if job_range is not None:
+            spec = EpisodeSpec(spec.algorithm_factory, spec.machine_configs, None, spec.seed, spec.event_file,
+                               spec.episode_kwargs)
+        elif not isinstance(spec.job_configs, list):
+            spec = EpisodeSpec(spec.algorithm_factory, spec.machine_configs, list(spec.job_configs), spec.seed,
+                               spec.event_file, spec.episode_kwargs)
+        return self.executor.submit(_run, spec, job_range, self.collect_trajectories)
+
+    def run(self, specs):
+        """
+        并行运行所有试验
+        :param specs: EpisodeSpec列表
+        :return: 与specs顺序一致的EpisodeResult列表
+        """
+        futures = [self.submit(spec) for spec in specs]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self.executor.shutdown()
+        if self.shared_arena is not None:
+            self.shared_arena.close()
+            self.shared_arena = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
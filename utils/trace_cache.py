@@ -0,0 +1,172 @@
+import argparse
+import hashlib
+import json
+import os
+import numpy as np
+
+"""
+
+定义了一个TraceCache类
+
+CSV作业轨迹的二进制缓存，保存在源文件旁边的目录(filename + '.cache')中：
+jobs.npy - 作业表，按提交时间排序，每个作业记录其任务在任务表中的起始位置和任务数量
+tasks.npy - 任务表，同一作业的任务连续存放，每个任务记录其父任务在父任务表中的起始位置和数量
+parents.npy - 父任务表，保存父任务的task_index
+meta.json - 源文件的大小、修改时间和内容哈希
+
+读取时使用np.load(mmap_mode='r')，返回的数组是对缓存文件的零拷贝视图
+源文件的大小或内容发生变化后缓存自动失效；只有修改时间变化而内容不变时，缓存仍然有效
+
+用法：python -m utils.trace_cache <目录> 为目录下的所有csv轨迹预先建立缓存
+
+"""
+
+JOB_DTYPE = np.dtype([('job_id', np.float64), ('submit_time', np.float64),
+                      ('task_offset', np.int64), ('tasks_number', np.int64),
+                      ('critical_path_length', np.float64)])
+TASK_DTYPE = np.dtype([('task_id', np.float64), ('instances_num', np.float64), ('cpu', np.float64),
+                       ('memory', np.float64), ('disk', np.float64), ('duration', np.float64),
+                       ('parent_offset', np.int64), ('parents_number', np.int64),
+                       ('level', np.int64), ('upward_rank', np.float64)])
+# 与TaskConfig构造参数顺序一致的字段，parents_number为-1表示没有依赖信息(parent_indices为None)
+TASK_CONFIG_FIELDS = ['task_id', 'instances_num', 'cpu', 'memory', 'disk', 'duration']
+TABLES = ('jobs', 'tasks', 'parents')
+
+
+def save_tables(directory, tables):
+    """
+    把作业表、任务表和父任务表写入目录，每个表先写到临时文件再替换
+    :param directory:
+    :param tables: (jobs, tasks, parents)
+    :return:
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, array in zip(TABLES, tables):
+        path = os.path.join(directory, name)
+        np.save(path + '.tmp.npy', np.ascontiguousarray(array), allow_pickle=False)
+        os.replace(path + '.tmp.npy', path + '.npy')
+
+
+def load_tables(directory, mmap_mode='r'):
+    """
+    读取save_tables()写入的表，默认以mmap方式零拷贝读取
+    :param directory:
+    :param mmap_mode:
+    :return: (jobs, tasks, parents)
+    """
+    return tuple(np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode) for name in TABLES)
+
+
+class TraceCache(object):
+    """
+
+    filename - 源CSV文件
+    directory - 缓存目录
+
+    """
+    version = 3
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.directory = filename + '.cache'
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def source_meta(self, content_hash=True):
+        stat = os.stat(self.filename)
+        meta = {'version': TraceCache.version, 'size': stat.st_size, 'mtime': stat.st_mtime}
+        if content_hash:
+            meta['sha1'] = self.content_hash()
+        return meta
+
+    def content_hash(self):
+        sha1 = hashlib.sha1()
+        with open(self.filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha1.update(block)
+        return sha1.hexdigest()
+
+    def source_hash(self):
+        """
+        源文件的内容哈希，缓存有效时直接使用meta.json中记录的值，不再读取源文件
+        :return: (str)
+        """
+        if self.is_valid():
+            with open(self.path('meta.json')) as f:
+                return json.load(f)['sha1']
+        return self.content_hash()
+
+    def is_valid(self):
+        """
+        检查缓存是否与源文件一致：大小和修改时间都相同时直接认为一致，
+        只有修改时间不同时再比较内容哈希，一致则更新记录的修改时间
+        :return: bool
+        """
+        try:
+            with open(self.path('meta.json')) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        source_meta = self.source_meta(content_hash=False)
+        if meta.get('version') != source_meta['version'] or meta.get('size') != source_meta['size']:
+            return False
+        if meta.get('mtime') == source_meta['mtime']:
+            return True
+        if meta.get('sha1') != self.content_hash():
+            return False
+        meta['mtime'] = source_meta['mtime']
+        self.write_meta(meta)
+        return True
+
+    def load(self):
+        """
+        读取缓存
+        :return: (jobs, tasks, parents)，缓存无效时返回None
+        """
+        if not self.is_valid():
+            return None
+        return load_tables(self.directory)
+
+    def save(self, jobs, tasks, parents):
+        """
+        写入缓存，meta.json最后写入，写入中途失败时缓存保持无效
+        :param jobs: JOB_DTYPE的结构化数组
+        :param tasks: TASK_DTYPE的结构化数组
+        :param parents: 父任务表
+        :return:
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.path('meta.json')):
+            os.remove(self.path('meta.json'))
+        save_tables(self.directory, (jobs, tasks, parents))
+        self.write_meta(self.source_meta())
+
+    def write_meta(self, meta):
+        with open(self.path('meta.json.tmp'), 'w') as f:
+            json.dump(meta, f)
+        os.replace(self.path('meta.json.tmp'), self.path('meta.json'))
+
+
+def build_caches(directory):
+    """
+    为目录下的所有csv轨迹建立缓存，已有的有效缓存不会重建
+    :param directory:
+    :return: 建立了缓存的文件列表
+    """
+    from utils.csv_reader import CSVReader
+
+    filenames = []
+    for name in sorted(os.listdir(directory)):
+        filename = os.path.join(directory, name)
+        if name.endswith('.csv') and os.path.isfile(filename):
+            CSVReader(filename, cache=True)
+            filenames.append(filename)
+    return filenames
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='为目录下的csv作业轨迹预先建立二进制缓存')
+    parser.add_argument('directory')
+    for built in build_caches(parser.parse_args().directory):
+        print(built)
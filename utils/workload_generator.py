@@ -0,0 +1,207 @@
+import numpy as np
+
+from utils.job_arena import JobArena, annotate_dag
+from utils.trace_cache import JOB_DTYPE, TASK_DTYPE, TASK_CONFIG_FIELDS
+
+"""
+
+定义了一个WorkloadGenerator类
+
+合成大规模作业负载，用于在远超现有轨迹的规模下测试调度器。生成结果直接是JobArena的三张表，
+可以通过arena.view()交给Broker，也可以用arena.save()写成可mmap读取的轨迹文件
+
+作业到达过程(arrival)：
+poisson - 到达率为rate的泊松过程
+bursty - 突发到达：突发以rate / burst_size的到达率出现，每次突发包含平均burst_size个同时到达的作业
+diurnal - 到达率按周期period正弦变化的非齐次泊松过程 rate * (1 + amplitude * sin(2πt / period))
+
+作业内容：默认使用简单的参数分布；fit(arena)之后从已有轨迹中按作业整体重采样，
+保留任务数量、实例数量、持续时间和资源需求之间的相关性
+
+依赖形状(dag)：
+None - 不生成依赖，parent_indices为None
+chain - 作业内的任务依次依赖前一个任务
+fork_join - 第一个任务是所有中间任务的父任务，最后一个任务依赖所有中间任务
+random - 每个任务以dag_probability的概率依赖作业内排在它之前的每个任务
+
+同一个seed总是生成相同的负载，所有步骤都是向量化的，生成千万级任务实例的负载只需要数秒
+
+"""
+
+
+class WorkloadGenerator(object):
+    """
+
+    seed - 随机数种子 (int)
+    arrival - 作业到达过程，'poisson'/'bursty'/'diurnal' (str)
+    rate - 平均到达率，每个时间单位到达的作业数 (float)
+    burst_size - bursty过程中每次突发的平均作业数 (float)
+    period/amplitude - diurnal过程的周期和到达率的相对振幅（0 <= amplitude < 1）
+    dag - 依赖形状，None/'chain'/'fork_join'/'random' (str)
+    dag_probability - random依赖形状中每条边出现的概率 (float)
+
+    """
+    arrivals = ('poisson', 'bursty', 'diurnal')
+    dags = (None, 'chain', 'fork_join', 'random')
+
+    def __init__(self, seed=0, arrival='poisson', rate=1.0, burst_size=10, period=86400, amplitude=0.5,
+                 dag=None, dag_probability=0.2):
+        if arrival not in WorkloadGenerator.arrivals:
+            raise ValueError('Unknown arrival process: %s.' % arrival)
+        if dag not in WorkloadGenerator.dags:
+            raise ValueError('Unknown DAG shape: %s.' % dag)
+        if not 0 <= amplitude < 1:
+            raise ValueError('Amplitude must be in [0, 1): %s.' % amplitude)
+        self.seed = seed
+        self.arrival = arrival
+        self.rate = rate
+        self.burst_size = burst_size
+        self.period = period
+        self.amplitude = amplitude
+        self.dag = dag
+        self.dag_probability = dag_probability
+        self.source = None  # fit()得到的样本轨迹
+
+    def fit(self, arena):
+        """
+        使用已有轨迹中的作业作为重采样的样本
+        :param arena: JobArena
+        :return: self
+        """
+        self.source = arena
+        return self
+
+    def generate(self, jobs_number):
+        """
+        生成jobs_number个作业
+        :param jobs_number:
+        :return: JobArena
+        """
+        rng = np.random.default_rng(self.seed)
+        submit_times = self.submit_times(rng, jobs_number)
+        if self.source is None:
+            tasks_numbers, tasks = self.sample_parametric(rng, jobs_number)
+        else:
+            tasks_numbers, tasks = self.sample_source(rng, jobs_number)
+
+        jobs = np.zeros(jobs_number, dtype=JOB_DTYPE)
+        jobs['job_id'] = np.arange(1, jobs_number + 1)
+        jobs['submit_time'] = submit_times
+        jobs['tasks_number'] = tasks_numbers
+        jobs['task_offset'] = np.cumsum(tasks_numbers) - tasks_numbers
+        tasks['task_id'] = np.arange(1, len(tasks) + 1)
+
+        parents = annotate_dag(jobs, tasks, self.add_dependencies(rng, jobs, tasks))
+        return JobArena(jobs, tasks, parents)
+
+    def submit_times(self, rng, jobs_number):
+        """
+        按到达过程生成单调不减的提交时间，第一个作业在0时刻提交
+        :param rng:
+        :param jobs_number:
+        :return:
+        """
+        if jobs_number == 0:
+            return np.zeros(0)
+        if self.arrival == 'poisson':
+            times = np.cumsum(rng.exponential(1 / self.rate, jobs_number))
+        elif self.arrival == 'bursty':
+            # 突发数量按期望多取一些，不够时再补
+            sizes = np.zeros(0, dtype=np.int64)
+            while sizes.sum() < jobs_number:
+                bursts_number = int(jobs_number / self.burst_size * 1.2) + 1
+                sizes = np.concatenate([sizes, rng.geometric(1 / self.burst_size, bursts_number)])
+            burst_times = np.cumsum(rng.exponential(self.burst_size / self.rate, len(sizes)))
+            times = np.repeat(burst_times, sizes)[:jobs_number]
+        else:
+            # 时间变换：单位泊松过程的到达时刻经累计到达率的反函数映射到实际时间
+            unit_times = np.cumsum(rng.exponential(1.0, jobs_number))
+            horizon = unit_times[-1] / (self.rate * (1 - self.amplitude)) + self.period
+            grid = np.linspace(0, horizon, max(int(horizon / self.period * 1000), 1000) + 1)
+            cumulative_rate = self.rate * (grid + self.amplitude * self.period / (2 * np.pi) *
+                                           (1 - np.cos(2 * np.pi * grid / self.period)))
+            times = np.interp(unit_times, cumulative_rate, grid)
+        return times - times[0]
+
+    @staticmethod
+    def sample_parametric(rng, jobs_number):
+        """
+        默认的参数分布：任务数和实例数服从几何分布，持续时间服从对数正态分布，资源需求接近jobs.csv中的取值
+        :param rng:
+        :param jobs_number:
+        :return: (每个作业的任务数, 任务表)
+        """
+        tasks_numbers = rng.geometric(1 / 6, jobs_number)
+        tasks = np.zeros(int(tasks_numbers.sum()), dtype=TASK_DTYPE)
+        tasks['instances_num'] = rng.geometric(1 / 80, len(tasks))
+        tasks['cpu'] = rng.choice([0.5, 1.0], len(tasks), p=[0.8, 0.2])
+        tasks['memory'] = rng.uniform(0.002, 0.02, len(tasks))
+        tasks['duration'] = np.maximum(1.0, rng.lognormal(3.5, 1.0, len(tasks)))
+        return tasks_numbers, tasks
+
+    def sample_source(self, rng, jobs_number):
+        """
+        从样本轨迹中有放回地抽取整个作业
+        :param rng:
+        :param jobs_number:
+        :return: (每个作业的任务数, 任务表)
+        """
+        source_jobs = self.source.jobs[rng.integers(0, len(self.source), jobs_number)]
+        tasks_numbers = source_jobs['tasks_number']
+        task_offsets = np.cumsum(tasks_numbers) - tasks_numbers
+        source_rows = np.arange(tasks_numbers.sum()) + np.repeat(source_jobs['task_offset'] - task_offsets,
+                                                                 tasks_numbers)
+        tasks = np.zeros(len(source_rows), dtype=TASK_DTYPE)
+        for field in TASK_CONFIG_FIELDS:
+            tasks[field] = self.source.tasks[field][source_rows]
+        return tasks_numbers, tasks
+
+    def add_dependencies(self, rng, jobs, tasks):
+        """
+        按依赖形状填写任务表中的父任务位置和数量，返回父任务表
+        :param rng:
+        :param jobs:
+        :param tasks:
+        :return: 父任务表
+        """
+        if self.dag is None:
+            tasks['parents_number'] = -1
+            return np.zeros(0, dtype=np.float64)
+
+        # 每个任务在作业内的位置、所在作业的第一个任务以及作业的任务数
+        job_starts = np.repeat(jobs['task_offset'], jobs['tasks_number'])
+        job_sizes = np.repeat(jobs['tasks_number'], jobs['tasks_number'])
+        positions = np.arange(len(tasks)) - job_starts
+
+        # 得到按子任务排序、同一子任务的父任务按位置排序的(子任务, 父任务)对，可以直接作为父任务表
+        if self.dag == 'chain':
+            children = np.flatnonzero(positions > 0)
+            parents = children - 1
+        elif self.dag == 'fork_join':
+            # 中间任务依赖第一个任务；只有两个任务的作业退化为链
+            forked = np.flatnonzero((positions > 0) & ((positions < job_sizes - 1) | (job_sizes == 2)))
+            # 任务数不少于3的作业，最后一个任务依赖所有中间任务
+            joins = np.flatnonzero((positions == job_sizes - 1) & (job_sizes >= 3))
+            joins_numbers = job_sizes[joins] - 2
+            joined_children = np.repeat(joins, joins_numbers)
+            joined_parents = np.arange(joins_numbers.sum()) - \
+                np.repeat(np.cumsum(joins_numbers) - joins_numbers, joins_numbers) + \
+                np.repeat(job_starts[joins] + 1, joins_numbers)
+            children = np.concatenate([forked, joined_children])
+            parents = np.concatenate([job_starts[forked], joined_parents])
+            order = np.argsort(children, kind='stable')
+            children, parents = children[order], parents[order]
+        else:
+            # 列出所有候选的(子任务, 父任务)对，每对独立地以dag_probability的概率保留
+            candidates_numbers = positions
+            children = np.repeat(np.arange(len(tasks)), candidates_numbers)
+            parents = np.arange(candidates_numbers.sum()) - \
+                np.repeat(np.cumsum(candidates_numbers) - candidates_numbers, candidates_numbers) + \
+                np.repeat(job_starts, candidates_numbers)
+            keep = rng.random(len(children)) < self.dag_probability
+            children, parents = children[keep], parents[keep]
+
+        parents_numbers = np.bincount(children, minlength=len(tasks))
+        tasks['parents_number'] = parents_numbers
+        tasks['parent_offset'] = np.cumsum(parents_numbers) - parents_numbers
+        return tasks['task_id'][parents].astype(np.float64)